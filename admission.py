@@ -0,0 +1,231 @@
+import logging
+import queue
+import threading
+import time
+
+from metrics import Counter, Gauge, Histogram
+from query_budget import track_queries
+from tracing import start_trace
+
+logger = logging.getLogger(__name__)
+
+updates_shed = Counter(
+    "bot_updates_shed_total",
+    "Обновления, отброшенные контролем нагрузки",
+    labels=("reason",),
+)
+updates_admitted = Counter(
+    "bot_updates_admitted_total", "Обновления, принятые в очередь обработки"
+)
+queue_depth = Gauge("bot_update_queue_depth", "Обновления в очереди обработки")
+updates_in_flight = Gauge("bot_updates_in_flight", "Обновления в обработке")
+update_db_usage = Histogram(
+    "bot_update_db_usage",
+    "Запросы и соединения с БД на одно обновление",
+    labels=("kind",),
+    buckets=(0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 30),
+)
+
+
+def _update_user_id(update):
+    """Пользователь, от которого пришло обновление (или None)."""
+    for event in (
+        update.message,
+        update.edited_message,
+        update.callback_query,
+        update.inline_query,
+    ):
+        if event is not None and event.from_user is not None:
+            return event.from_user.id
+    return None
+
+
+def _command_sent_at(update, command_texts):
+    """
+    Время отправки команды (текст с "/") или нажатия кнопки из command_texts
+    (unix time) или None, если обновление не команда.
+    """
+    message = update.message or update.edited_message
+    if message is None or not message.text:
+        return None
+    if message.text.startswith("/") or message.text in command_texts:
+        return message.date
+    return None
+
+
+class AdmissionController:
+    """
+    Контроль нагрузки перед обработчиками бота.
+
+    Обновления из polling попадают в ограниченную очередь и разбираются
+    фиксированным числом потоков. Обновление отбрасывается, если:
+    - очередь заполнена (queue_full);
+    - у пользователя уже слишком много обновлений в очереди и в работе (per_user);
+    - команда или нажатие кнопки из command_texts отправлены раньше,
+      чем max_update_age секунд назад (stale);
+    - обновление ждало в очереди дольше max_queue_wait секунд (queue_wait);
+    - бот останавливается (shutdown).
+
+    Смещение getUpdates продвигается сразу при получении обновления,
+    а не после обработки, иначе polling получал бы те же обновления повторно.
+    Обновления, отклонённые при остановке, смещение не продвигают:
+    Telegram отдаст их следующему экземпляру бота.
+
+    По возрасту отбрасываются только команды: устаревший ответ на "Дальше"
+    не нужен, а ответ на карточку, текст новой фразы или список /bulk
+    пользователь ввёл сам, и они обрабатываются, сколько бы ни ждали.
+    """
+
+    def __init__(
+        self,
+        workers,
+        max_queue,
+        per_user_limit,
+        max_update_age,
+        max_queue_wait,
+    ):
+        self.workers = workers
+        self.per_user_limit = per_user_limit
+        self.max_update_age = max_update_age
+        self.max_queue_wait = max_queue_wait
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._per_user = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._bot = None
+        self._process = None
+        self._closed = False
+        self.drained = False
+        # Тексты кнопок, которые, как и команды, можно отбрасывать по возрасту
+        self.command_texts = frozenset()
+        # Вызывается один раз при получении первого обновления
+        self.on_first_update = None
+
+        queue_depth.set_function(self._queue.qsize)
+
+    def install(self, bot):
+        """Встаёт между polling и обработчиками бота."""
+        self._bot = bot
+        self._process = bot.process_new_updates
+        bot.process_new_updates = self.submit_updates
+
+    def start(self):
+        for number in range(self.workers):
+            thread = threading.Thread(
+                target=self._worker, name=f"updates-{number}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+        logger.info(
+            f"🚦 Очередь обновлений: {self.workers} потоков, "
+            f"до {self._queue.maxsize} в очереди"
+        )
+
+    def submit_updates(self, updates):
+        if self._closed:
+            # telebot сбрасывает флаг остановки при старте polling, поэтому
+            # stop_polling, вызванный до старта, повторяем после каждого getUpdates
+            self._bot.stop_polling()
+
+        if updates and self.on_first_update is not None:
+            callback, self.on_first_update = self.on_first_update, None
+            callback()
+
+        for update in updates:
+            self.submit(update)
+
+    def submit(self, update):
+        """Ставит обновление в очередь; возвращает False, если оно отброшено."""
+        if self._closed:
+            return self._shed(update, "shutdown")
+
+        if self._bot is not None and update.update_id > self._bot.last_update_id:
+            self._bot.last_update_id = update.update_id
+
+        sent_at = _command_sent_at(update, self.command_texts)
+        if sent_at is not None and time.time() - sent_at > self.max_update_age:
+            return self._shed(update, "stale")
+
+        user_id = _update_user_id(update)
+        with self._lock:
+            if self._per_user.get(user_id, 0) >= self.per_user_limit:
+                return self._shed(update, "per_user")
+            self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+
+        try:
+            self._queue.put_nowait((update, user_id, time.monotonic()))
+        except queue.Full:
+            self._release_user(user_id)
+            return self._shed(update, "queue_full")
+
+        updates_admitted.inc()
+        return True
+
+    def _shed(self, update, reason):
+        updates_shed.inc(reason=reason)
+        logger.warning(f"Обновление {update.update_id} отброшено: {reason}")
+        return False
+
+    def _release_user(self, user_id):
+        with self._lock:
+            count = self._per_user.get(user_id, 0) - 1
+            if count > 0:
+                self._per_user[user_id] = count
+            else:
+                self._per_user.pop(user_id, None)
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+
+            update, user_id, queued_at = item
+            try:
+                queue_wait = time.monotonic() - queued_at
+                if queue_wait > self.max_queue_wait:
+                    self._shed(update, "queue_wait")
+                    continue
+
+                updates_in_flight.inc()
+                try:
+                    with track_queries() as stats, start_trace(
+                        update_id=update.update_id,
+                        user_id=user_id,
+                        queue_wait_ms=round(queue_wait * 1000, 3),
+                    ):
+                        self._process([update])
+                finally:
+                    updates_in_flight.dec()
+                    update_db_usage.observe(stats.queries, kind="queries")
+                    update_db_usage.observe(stats.connections, kind="connections")
+            except Exception as e:
+                logger.error(f"Ошибка обработки обновления {update.update_id}: {e}")
+            finally:
+                self._release_user(user_id)
+                self._queue.task_done()
+
+    def close(self):
+        """Перестаёт принимать обновления (первый шаг остановки)."""
+        self._closed = True
+
+    def stop(self, timeout=None):
+        """
+        Дожидается обработки очереди и останавливает потоки.
+        Возвращает True, если все обновления успели обработаться.
+        """
+        self.close()
+        for _ in self._threads:
+            self._queue.put(None)
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            thread.join(remaining)
+
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        self.drained = not self._threads
+        return self.drained
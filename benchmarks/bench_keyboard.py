@@ -0,0 +1,82 @@
+"""
+Микро-бенчмарк: клавиатура карточки через ReplyKeyboardMarkup
+против сборки JSON с заранее сериализованными рядами команд (keyboards.py).
+
+Замеряется то, что делается на каждую карточку: кнопки и их сериализация
+в JSON для Bot API. База и Telegram не нужны.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_keyboard --iterations 100000
+"""
+import argparse
+import random
+import statistics
+import time
+
+from telebot import types
+
+from keyboards import LearningKeyboard
+
+COMMANDS = ["Дальше ⏭", "Добавить фразу ➕", "Удалить фразу 🔙", "Статистика 📊", "Примеры 💡"]
+
+
+def markup_keyboard(answers):
+    """Как create_learning_keyboard собирал клавиатуру раньше."""
+    markup = types.ReplyKeyboardMarkup(row_width=2, resize_keyboard=True)
+    buttons = [types.KeyboardButton(text) for text in answers]
+    buttons.extend(types.KeyboardButton(text) for text in COMMANDS)
+    markup.add(*buttons)
+    return markup.to_json()
+
+
+def _time_batches(func, cards, batches):
+    """Время на одну карточку в микросекундах (медиана и среднее по партиям)."""
+    timings = []
+    for _ in range(batches):
+        started = time.perf_counter()
+        for answers in cards:
+            func(answers)
+        timings.append((time.perf_counter() - started) * 1_000_000 / len(cards))
+    return statistics.median(timings), statistics.fmean(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=100000, help="карточек на замер")
+    parser.add_argument("--batches", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    words = ["take", "a", "look", "at", "this", "make", "up", "your", "mind", "by", "the", "way"]
+    cards = [
+        [" ".join(rng.choices(words, k=rng.randint(2, 5))) for _ in range(4)]
+        for _ in range(max(args.iterations // args.batches, 1))
+    ]
+
+    keyboard = LearningKeyboard(COMMANDS)
+    for answers in cards[:100]:
+        assert keyboard.render(answers).to_json() == markup_keyboard(answers)
+
+    print(
+        f"⏱️ Карточек на замер: {len(cards) * args.batches} "
+        "(мкс на карточку: медиана / среднее)\n"
+    )
+    results = {
+        "markup": _time_batches(markup_keyboard, cards, args.batches),
+        "rendered": _time_batches(
+            lambda answers: keyboard.render(answers).to_json(), cards, args.batches
+        ),
+    }
+    for name, (median, mean) in results.items():
+        print(f"   {name:<10} {median:>8.2f} / {mean:>8.2f}")
+
+    saved = results["markup"][0] - results["rendered"][0]
+    print(
+        f"\nЭкономия {saved:.2f} мкс на карточку ({saved / results['markup'][0]:.0%}), "
+        f"при 1000 карточек/с это {saved * 1000 / 1_000_000:.1%} одного ядра"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Микро-бенчмарк: подключение на каждый вызов против пула
+и текстовые запросы против подготовленных.
+
+Запуск из корня проекта (нужна база из DATABASE_URL с таблицами init_db):
+    python -m benchmarks.bench_prepared --iterations 2000
+"""
+import argparse
+import random
+import statistics
+import time
+
+import pg8000
+
+import database
+
+# Горячие запросы в двух вариантах: текст для cursor.execute
+# и тот же запрос с :name-параметрами для подготовленного выполнения
+HOT_STATEMENTS = {
+    "user_stats": (
+        "SELECT total_phrases, learned_phrases FROM user_stats WHERE user_id = %s",
+        "SELECT total_phrases, learned_phrases FROM user_stats WHERE user_id = :user_id",
+        lambda: {"user_id": random.randint(1, 1000)},
+    ),
+    "last_phrase": (
+        "SELECT last_shown_phrase_id FROM users WHERE user_id = %s",
+        "SELECT last_shown_phrase_id FROM users WHERE user_id = :user_id",
+        lambda: {"user_id": random.randint(1, 1000)},
+    ),
+    "distractors": (
+        """
+        SELECT phrase_id, english_phrase, russian_translation
+        FROM phrases
+        WHERE phrase_id != %s AND random_key >= %s
+        ORDER BY random_key
+        LIMIT %s
+        """,
+        """
+        SELECT phrase_id, english_phrase, russian_translation
+        FROM phrases
+        WHERE phrase_id != :phrase_id AND random_key >= :start_key
+        ORDER BY random_key
+        LIMIT :fetch_limit
+        """,
+        lambda: {
+            "phrase_id": random.randint(1, 1000),
+            "start_key": random.random(),
+            "fetch_limit": 18,
+        },
+    ),
+    "next_phrase": (
+        """
+        SELECT p.phrase_id, p.english_phrase, p.russian_translation
+        FROM phrases p
+        LEFT JOIN user_phrases up
+          ON up.phrase_id = p.phrase_id AND up.user_id = %s
+        WHERE (up.is_learned IS NULL OR up.is_learned = FALSE)
+          AND p.phrase_id IS DISTINCT FROM %s
+        ORDER BY COALESCE(up.correct_answers, 0) ASC, RANDOM()
+        LIMIT 1
+        """,
+        """
+        SELECT p.phrase_id, p.english_phrase, p.russian_translation
+        FROM phrases p
+        LEFT JOIN user_phrases up
+          ON up.phrase_id = p.phrase_id AND up.user_id = :user_id
+        WHERE (up.is_learned IS NULL OR up.is_learned = FALSE)
+          AND p.phrase_id IS DISTINCT FROM :exclude_phrase_id
+        ORDER BY COALESCE(up.correct_answers, 0) ASC, RANDOM()
+        LIMIT 1
+        """,
+        lambda: {"user_id": random.randint(1, 1000), "exclude_phrase_id": None},
+    ),
+}
+
+
+def _time_calls(func, iterations):
+    """Возвращает время одного вызова в микросекундах (медиана и среднее)."""
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1_000_000)
+    return statistics.median(timings), statistics.fmean(timings)
+
+
+def bench_connections(iterations):
+    db_config = database.parse_database_url(database.DATABASE_URL)
+
+    def fresh():
+        conn = pg8000.connect(**db_config)
+        conn.close()
+
+    def pooled():
+        database.get_connection().close()
+
+    pooled()  # прогрев пула
+    return {
+        "connect_per_call": _time_calls(fresh, iterations),
+        "pooled": _time_calls(pooled, iterations),
+    }
+
+
+def bench_statements(iterations):
+    results = {}
+    conn = database.get_connection()
+
+    try:
+        for name, (text_sql, prepared_sql, make_params) in HOT_STATEMENTS.items():
+            cur = conn.cursor()
+
+            def text():
+                params = make_params()
+                cur.execute(text_sql, tuple(params.values()))
+                cur.fetchall()
+
+            def prepared():
+                conn.run(prepared_sql, **make_params())
+
+            # Прогрев: подготовка запроса и кэши сервера
+            text()
+            prepared()
+
+            results[name] = {
+                "text": _time_calls(text, iterations),
+                "prepared": _time_calls(prepared, iterations),
+            }
+            cur.close()
+    finally:
+        conn.close()
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+
+    print(f"⏱️ Итераций на замер: {args.iterations} (мкс на вызов: медиана / среднее)\n")
+
+    connections = bench_connections(max(args.iterations // 10, 10))
+    print("Соединение:")
+    for name, (median, mean) in connections.items():
+        print(f"   {name:<18} {median:>9.1f} / {mean:>9.1f}")
+
+    print("\nЗапросы:")
+    for name, variants in bench_statements(args.iterations).items():
+        text_median = variants["text"][0]
+        prepared_median = variants["prepared"][0]
+        saved = text_median - prepared_median
+        print(
+            f"   {name:<14} text {text_median:>8.1f}   prepared {prepared_median:>8.1f}"
+            f"   экономия {saved:>7.1f} мкс ({saved / text_median:.0%})"
+        )
+
+    database.close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+"""
+Нагрузочный тест бота без Telegram: обработчики main.py работают против
+локального фейкового Bot API, а база - PostgreSQL из DATABASE_URL.
+
+Каждый виртуальный пользователь проходит сессию
+/start → ответы → «Дальше» → «Статистика» → «Примеры».
+Обновления идут через ту же очередь AdmissionController, что и в боте.
+Все случайные решения берутся из --seed, поэтому прогоны сравнимы между собой.
+
+Запуск из корня проекта (нужна отдельная база для тестов):
+    python -m benchmarks.loadtest --users 1000 --concurrency 50 --output result.json
+
+Правильный ответ содержит паузу бота в 1 секунду перед следующей карточкой,
+она входит в задержку шага answer.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+# Настройки бота для теста задаются до импорта config: без лимита частоты,
+# без внешнего словаря, без эндпоинта метрик и без логов трассировки
+os.environ.setdefault("BOT_TOKEN", "1:loadtest")
+os.environ.setdefault("RATE_LIMIT_PER_SECOND", "1000")
+os.environ.setdefault("RATE_LIMIT_BURST", "1000")
+os.environ.setdefault("METRICS_PORT", "0")
+os.environ.setdefault("TRACE_SLOW_MS", "60000")
+os.environ["YA_DICTIONARY_API_KEY"] = ""
+
+import logging  # noqa: E402
+
+from telebot import apihelper, types  # noqa: E402
+
+from query_budget import budget_exceeded_total, track_queries  # noqa: E402
+
+# ID виртуальных пользователей заведомо не пересекаются с настоящими
+USER_ID_BASE = 10**12
+LOADTEST_PHRASE_PREFIX = "loadtest phrase"
+
+# Сколько ждать обработки одного обновления, прежде чем считать его потерянным
+UPDATE_TIMEOUT = 30
+
+
+class FakeBotApi:
+    """
+    Локальный сервер, отвечающий как Telegram Bot API.
+    Запоминает число вызовов каждого метода.
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self._lock = threading.Lock()
+        self._message_ids = itertools.count(1)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}/bot{{0}}/{{1}}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    def respond(self, method, params):
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Load", "username": "loadbot"}
+        if method in ("sendMessage", "editMessageText"):
+            chat_id = int(params.get("chat_id", 0))
+            return {
+                "message_id": int(params.get("message_id") or next(self._message_ids)),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": params.get("text", ""),
+            }
+        return True
+
+    def _handler_class(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self):
+                parts = urlsplit(self.path)
+                method = parts.path.rsplit("/", 1)[-1]
+                params = dict(parse_qsl(parts.query))
+
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    params.update(parse_qsl(self.rfile.read(length).decode("utf-8")))
+
+                body = json.dumps(
+                    {"ok": True, "result": api.respond(method, params)}
+                ).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = _reply
+            do_POST = _reply
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class LoadTest:
+    def __init__(self, bot_module, fake_api, seed):
+        self.main = bot_module
+        self.fake_api = fake_api
+        self.seed = seed
+
+        self._update_ids = itertools.count(1)
+        self._done = {}
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.queries = {}
+        self.connections = 0
+        self.lost = 0
+        self._usage = {}
+
+        # Отмечаем завершение обработки каждого обновления
+        original_process = self.main.admission._process
+
+        def process(updates):
+            with track_queries() as stats:
+                try:
+                    original_process(updates)
+                finally:
+                    for update in updates:
+                        self._usage[update.update_id] = stats
+                        self._done[update.update_id].set()
+
+        self.main.admission._process = process
+
+    def _make_update(self, user_id, text):
+        update_id = next(self._update_ids)
+        message = {
+            "message_id": update_id,
+            "from": {
+                "id": user_id,
+                "is_bot": False,
+                "first_name": "Load",
+                "username": f"load{user_id}",
+            },
+            "chat": {"id": user_id, "type": "private"},
+            "date": int(time.time()),
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [
+                {"type": "bot_command", "offset": 0, "length": len(text)}
+            ]
+        return types.Update.de_json({"update_id": update_id, "message": message})
+
+    def send(self, step, user_id, text):
+        """Отправляет обновление и ждёт, пока бот его обработает."""
+        update = self._make_update(user_id, text)
+        done = threading.Event()
+        self._done[update.update_id] = done
+
+        started = time.perf_counter()
+        admitted = self.main.admission.submit(update)
+        finished = admitted and done.wait(UPDATE_TIMEOUT)
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            del self._done[update.update_id]
+            stats = self._usage.pop(update.update_id, None)
+            if finished:
+                self.latencies.setdefault(step, []).append(elapsed)
+                self.queries.setdefault(step, []).append(stats.queries)
+                self.connections += stats.connections
+            else:
+                self.lost += 1
+
+    def current_answer(self, user_id):
+        with self.main.bot.retrieve_data(user_id, user_id) as data:
+            return (data or {}).get("target_phrase")
+
+    def run_session(self, number, answers, accuracy):
+        rng = random.Random(self.seed * 1_000_003 + number)
+        user_id = USER_ID_BASE + number
+
+        self.send("start", user_id, "/start")
+        for _ in range(answers):
+            target = self.current_answer(user_id)
+            if target is None:
+                break
+
+            if rng.random() < accuracy:
+                self.send("answer", user_id, target)
+            else:
+                self.send("answer", user_id, "wrong answer")
+                self.send("next", user_id, self.main.Command.NEXT)
+
+        self.send("stats", user_id, self.main.Command.STATS)
+        self.send("examples", user_id, self.main.Command.EXAMPLES)
+
+
+def percentiles(values):
+    ordered = sorted(values)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000
+
+    return {
+        "count": len(ordered),
+        "p50_ms": round(rank(50), 2),
+        "p95_ms": round(rank(95), 2),
+        "p99_ms": round(rank(99), 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 2),
+    }
+
+
+def count_db_calls(database):
+    """Сколько раз вызывались функции database.py (по гистограмме метрик)."""
+    return sum(
+        value
+        for name, _, value in database.db_call_seconds.samples()
+        if name.endswith("_count")
+    )
+
+
+def ensure_catalog(database, min_phrases):
+    """Дополняет каталог синтетическими фразами, если он слишком мал."""
+    conn = database.get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT COUNT(*) FROM phrases")
+        missing = min_phrases - cur.fetchone()[0]
+        if missing > 0:
+            cur.execute(
+                """
+                INSERT INTO phrases (english_phrase, russian_translation)
+                SELECT %s || ' ' || g, 'нагрузочная фраза ' || g
+                FROM generate_series(1, %s) g
+                ON CONFLICT DO NOTHING
+                """,
+                (LOADTEST_PHRASE_PREFIX, missing),
+            )
+            conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+
+def cleanup(database, users):
+    """Удаляет виртуальных пользователей и синтетические фразы."""
+    conn = database.get_connection()
+    cur = conn.cursor()
+    try:
+        user_range = (USER_ID_BASE, USER_ID_BASE + users)
+        cur.execute(
+            "DELETE FROM card_impressions WHERE user_id >= %s AND user_id < %s",
+            user_range,
+        )
+        cur.execute(
+            "DELETE FROM users WHERE user_id >= %s AND user_id < %s", user_range
+        )
+        cur.execute(
+            "DELETE FROM phrases WHERE english_phrase LIKE %s",
+            (LOADTEST_PHRASE_PREFIX + " %",),
+        )
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--answers", type=int, default=3, help="ответов за сессию")
+    parser.add_argument("--accuracy", type=float, default=0.7)
+    parser.add_argument("--min-phrases", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="сохранить результат в JSON-файл")
+    parser.add_argument(
+        "--keep-data", action="store_true", help="не удалять тестовых пользователей"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    random.seed(args.seed)
+
+    fake_api = FakeBotApi()
+    fake_api.start()
+    apihelper.API_URL = fake_api.url
+
+    import database
+    import main as bot_main
+
+    logging.getLogger().setLevel(logging.ERROR)
+
+    database.init_db()
+    ensure_catalog(database, args.min_phrases)
+    bot_main.admission.start()
+
+    load_test = LoadTest(bot_main, fake_api, args.seed)
+    db_calls_before = count_db_calls(database)
+
+    print(
+        f"🏋️ {args.users} пользователей, {args.concurrency} одновременно, "
+        f"seed {args.seed}"
+    )
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        sessions = [
+            pool.submit(load_test.run_session, number, args.answers, args.accuracy)
+            for number in range(args.users)
+        ]
+        for session in sessions:
+            session.result()
+    wall_time = time.perf_counter() - started
+
+    db_calls = count_db_calls(database) - db_calls_before
+    all_latencies = list(itertools.chain.from_iterable(load_test.latencies.values()))
+    all_queries = list(itertools.chain.from_iterable(load_test.queries.values()))
+    updates = len(all_latencies)
+
+    result = {
+        "config": vars(args),
+        "updates": updates,
+        "lost_updates": load_test.lost,
+        "wall_time_s": round(wall_time, 2),
+        "throughput_per_s": round(updates / wall_time, 1),
+        "db_calls_per_update": round(db_calls / updates, 2) if updates else 0,
+        "db_queries_per_update": (
+            round(statistics.fmean(all_queries), 2) if updates else 0
+        ),
+        "db_connections_per_update": (
+            round(load_test.connections / updates, 2) if updates else 0
+        ),
+        "query_budget_exceeded": {
+            labels: value for _, labels, value in budget_exceeded_total.samples()
+        },
+        "telegram_calls_per_update": (
+            round(fake_api.total_calls() / updates, 2) if updates else 0
+        ),
+        "latency": {"all": percentiles(all_latencies)} if updates else {},
+    }
+    for step, values in sorted(load_test.latencies.items()):
+        result["latency"][step] = percentiles(values)
+        queries = load_test.queries[step]
+        result["latency"][step]["db_queries_mean"] = round(statistics.fmean(queries), 2)
+        result["latency"][step]["db_queries_max"] = max(queries)
+
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+
+    bot_main.admission.stop(timeout=5)
+    if not args.keep_data:
+        cleanup(database, args.users)
+    fake_api.stop()
+    database.close_pool()
+
+
+if __name__ == "__main__":
+    main()
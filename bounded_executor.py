@@ -0,0 +1,78 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedExecutor:
+    """
+    Пул потоков с ограниченной очередью задач.
+    Если все рабочие потоки заняты и очередь заполнена, новая задача
+    не ставится в очередь: submit() возвращает None, и вызывающий
+    сам решает, что ответить пользователю.
+    """
+
+    def __init__(self, max_workers, max_queue, name="worker"):
+        self.name = name
+        self.capacity = max_workers + max_queue
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=name
+        )
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = 0
+
+    @property
+    def pending(self):
+        """Количество задач в очереди и в работе."""
+        return self._pending
+
+    def submit(self, func, *args):
+        """Ставит задачу в очередь или возвращает None, если очередь заполнена."""
+        with self._lock:
+            if self._pending >= self.capacity:
+                logger.warning(
+                    f"Очередь '{self.name}' заполнена ({self._pending}), задача отклонена"
+                )
+                return None
+            self._pending += 1
+
+        try:
+            future = self._executor.submit(func, *args)
+        except RuntimeError:
+            # Пул уже остановлен
+            self._release(None)
+            return None
+
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        with self._lock:
+            self._pending -= 1
+            if self._pending == 0:
+                self._idle.notify_all()
+
+        if future is not None and not future.cancelled() and future.exception():
+            logger.error(f"Ошибка в задаче '{self.name}': {future.exception()}")
+
+    def drain(self, timeout):
+        """
+        Ждёт завершения задач не дольше timeout секунд и останавливает пул.
+        Задачи, не начавшиеся к этому времени, отменяются.
+        Возвращает True, если все задачи завершились.
+        """
+        with self._idle:
+            drained = self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if not drained:
+            logger.warning(
+                f"Пул '{self.name}' остановлен, не дождавшись {self._pending} задач"
+            )
+        return drained
+
+    def shutdown(self, wait=True):
+        """Останавливает пул, не принимая новых задач."""
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,73 @@
+import csv
+import itertools
+
+# Разделители для вставленного текста: "english - russian" и похожие варианты
+TEXT_SEPARATORS = ["\t", " - ", " — ", " – ", ";"]
+
+# Заголовки, которые пропускаем в первой строке CSV
+HEADER_NAMES = {"phrase", "english", "english_phrase", "английский"}
+
+MAX_PHRASE_LENGTH = 200
+
+
+def _clean_pair(english_phrase, russian_translation):
+    """Очищает пару и проверяет её; возвращает (english, russian) или None."""
+    english_phrase = english_phrase.strip().strip('"')
+    russian_translation = russian_translation.strip().strip('"')
+
+    if not english_phrase or not russian_translation:
+        return None
+    if len(english_phrase) > MAX_PHRASE_LENGTH or len(russian_translation) > MAX_PHRASE_LENGTH:
+        return None
+    return english_phrase, russian_translation
+
+
+def iter_text_phrases(lines):
+    """
+    Разбирает строки вида "english - russian" по одной, не читая всё сразу.
+    Выдаёт (english, russian) или None для строк, которые не удалось разобрать.
+    """
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        for separator in TEXT_SEPARATORS:
+            if separator in line:
+                english_phrase, russian_translation = line.split(separator, 1)
+                yield _clean_pair(english_phrase, russian_translation)
+                break
+        else:
+            yield None
+
+
+def iter_csv_phrases(lines):
+    """
+    Разбирает CSV-файл (первые две колонки: английская фраза и перевод) построчно.
+    Разделитель определяется по первой строке, как в phrases_loader.
+    """
+    lines = iter(lines)
+    first_line = next(lines, "")
+
+    for delimiter in [";", "\t", ","]:
+        if delimiter in first_line:
+            break
+    else:
+        # Одна колонка - возможно, это обычный текст "english - russian"
+        yield from iter_text_phrases(itertools.chain([first_line], lines))
+        return
+
+    reader = csv.reader(
+        itertools.chain([first_line], lines), delimiter=delimiter, skipinitialspace=True
+    )
+    for row_num, row in enumerate(reader):
+        if not row or not any(cell.strip() for cell in row):
+            continue
+        if row_num == 0 and row[0].strip().lower() in HEADER_NAMES:
+            continue
+        if len(row) < 2:
+            yield None
+            continue
+
+        yield _clean_pair(row[0], row[1])
+
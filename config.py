@@ -8,12 +8,98 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 DATABASE_URL = os.getenv("DATABASE_URL")
 YA_DICTIONARY_API_KEY = os.getenv("YA_DICTIONARY_API_KEY")
 
-# Проверка обязательных переменных
-if not BOT_TOKEN:
-    raise ValueError("❌ BOT_TOKEN не установлен в .env файле")
+# Локальный офлайн-словарь (SQLite, см. dictionary.py) и запасной Yandex
+DICTIONARY_PATH = os.getenv("DICTIONARY_PATH")
+DICTIONARY_YANDEX_FALLBACK = os.getenv("DICTIONARY_YANDEX_FALLBACK", "1") == "1"
 
-if not DATABASE_URL:
-    raise ValueError("❌ DATABASE_URL не установлен в .env файле")
+# Пул соединений с БД: размер и ожидание свободного соединения (сек)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+
+# Реплики только для чтения (через запятую, в формате DATABASE_URL).
+# Реплика, отставшая больше REPLICA_MAX_LAG_SECONDS, исключается, а чтения
+# пользователя после его записи READ_YOUR_WRITES_SECONDS идут на основную БД.
+# Окно не может быть короче допустимого отставания, иначе чтение попадёт
+# на реплику, которая ещё не видит запись.
+DATABASE_READ_URLS = [
+    url.strip() for url in os.getenv("DATABASE_READ_URLS", "").split(",") if url.strip()
+]
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "10"))
+READ_YOUR_WRITES_SECONDS = max(
+    float(os.getenv("READ_YOUR_WRITES_SECONDS", "0")), REPLICA_MAX_LAG_SECONDS
+)
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+
+# Как часто (в минутах) пересчитывать снимок статистики для /users
+ADMIN_STATS_REFRESH_MINUTES = int(os.getenv("ADMIN_STATS_REFRESH_MINUTES", "15"))
+
+# Пул для поиска примеров: число потоков и максимальная длина очереди
+EXAMPLES_WORKERS = int(os.getenv("EXAMPLES_WORKERS", "4"))
+EXAMPLES_QUEUE_SIZE = int(os.getenv("EXAMPLES_QUEUE_SIZE", "50"))
+
+# Контроль нагрузки входящих обновлений (см. admission.py): потоки обработки,
+# длина очереди, лимит обновлений одного пользователя в очереди и в работе,
+# возраст команды или нажатия кнопки и время ожидания в очереди (сек), после
+# которых обновление отбрасывается
+ADMISSION_WORKERS = int(os.getenv("ADMISSION_WORKERS", "8"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "200"))
+ADMISSION_PER_USER_LIMIT = int(os.getenv("ADMISSION_PER_USER_LIMIT", "3"))
+MAX_UPDATE_AGE_SECONDS = float(os.getenv("MAX_UPDATE_AGE_SECONDS", "60"))
+MAX_QUEUE_WAIT_SECONDS = float(os.getenv("MAX_QUEUE_WAIT_SECONDS", "30"))
+
+# Ограничение частоты запросов пользователя (token bucket, см. ratelimit.py):
+# токенов в секунду и максимальный всплеск. С RATE_LIMIT_REDIS_URL лимит
+# общий для всех процессов бота.
+RATE_LIMIT_PER_SECOND = float(os.getenv("RATE_LIMIT_PER_SECOND", "1"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "5"))
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
+
+# Порт HTTP-эндпоинта /metrics на 127.0.0.1 (0 - не запускать)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+# Трассировки обновлений дольше TRACE_SLOW_MS пишутся в лог JSON-строкой
+# и, если задан TRACE_EXPORT_PATH, дописываются в этот JSONL-файл
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "1000"))
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH")
+
+# Остановка: сколько секунд ждать начатые обработчики после SIGTERM
+# и длительность long polling (остановка ждёт завершения текущего запроса)
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "20"))
+POLLING_TIMEOUT = int(os.getenv("POLLING_TIMEOUT", "10"))
+
+
+# Индекс похожих фраз для неправильных вариантов ответа (см. similarity.py,
+# нужен numpy): размерность векторов триграмм, число соседей каждой фразы
+# и сколько фраз-кандидатов просматривать при построении индекса
+SIMILARITY_INDEX = os.getenv("SIMILARITY_INDEX", "1") == "1"
+SIMILARITY_DIMENSIONS = int(os.getenv("SIMILARITY_DIMENSIONS", "256"))
+SIMILARITY_NEIGHBOURS = int(os.getenv("SIMILARITY_NEIGHBOURS", "20"))
+SIMILARITY_MAX_CANDIDATES = int(os.getenv("SIMILARITY_MAX_CANDIDATES", "20000"))
+
+# Очередь следующих карточек пользователя (см. study_queue.py): сколько
+# карточек держать, при каком остатке пополнять, потоки пополнения и сколько
+# пополнений может ждать их, для скольких пользователей хранить очереди
+# и через сколько секунд без пополнения сбрасывать.
+# STUDY_QUEUE_SIZE=0 выключает очередь.
+STUDY_QUEUE_SIZE = int(os.getenv("STUDY_QUEUE_SIZE", "10"))
+STUDY_QUEUE_LOW_WATER = int(os.getenv("STUDY_QUEUE_LOW_WATER", "3"))
+STUDY_QUEUE_WORKERS = int(os.getenv("STUDY_QUEUE_WORKERS", "2"))
+STUDY_QUEUE_BACKLOG = int(os.getenv("STUDY_QUEUE_BACKLOG", "100"))
+STUDY_QUEUE_MAX_USERS = int(os.getenv("STUDY_QUEUE_MAX_USERS", "10000"))
+STUDY_QUEUE_TTL_SECONDS = float(os.getenv("STUDY_QUEUE_TTL_SECONDS", "600"))
+
+# Список колод общего каталога (/decks) кэшируется в процессе на столько секунд:
+# каталог меняется только загрузчиком фраз, а запрос читает его целиком.
+CATALOG_DECKS_CACHE_SECONDS = float(os.getenv("CATALOG_DECKS_CACHE_SECONDS", "300"))
+
+
+def validate_config():
+    """Проверка обязательных переменных (вызывается при запуске бота)"""
+    if not BOT_TOKEN:
+        raise ValueError("❌ BOT_TOKEN не установлен в .env файле")
+
+    if not DATABASE_URL:
+        raise ValueError("❌ DATABASE_URL не установлен в .env файле")
 
 
 def debug_config():
@@ -24,6 +110,10 @@ def debug_config():
     print(
         f"YA_API_KEY: {'✅ SET' if YA_DICTIONARY_API_KEY else '⚠️ NOT SET (опционально)'}"
     )
+    print(f"DATABASE_READ_URLS: {len(DATABASE_READ_URLS)} реплик")
+    print(
+        f"DICTIONARY_PATH: {DICTIONARY_PATH or '⚠️ NOT SET (опционально)'}"
+    )
 
 
 if __name__ == "__main__":
@@ -1,6 +1,26 @@
+import itertools
+import queue
+import random
 import re
+import threading
+import time
+from datetime import date, timedelta
+
 import pg8000
-from config import DATABASE_URL
+from config import (
+    CATALOG_DECKS_CACHE_SECONDS,
+    DATABASE_READ_URLS,
+    DATABASE_URL,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    READ_YOUR_WRITES_SECONDS,
+    REPLICA_MAX_LAG_SECONDS,
+    REPLICA_RETRY_SECONDS,
+)
+from metrics import Gauge, Histogram, timed
+from migrations import apply_migrations
+from query_budget import count_connection, count_query
+from tracing import span
 
 LEARNED_THRESHOLD = 3
 
@@ -23,14 +43,350 @@ def parse_database_url(url: str) -> dict:
     }
 
 
+class PoolExhausted(RuntimeError):
+    """Все соединения пула заняты дольше DB_POOL_TIMEOUT (база при этом доступна)."""
+
+
+class ConnectionPool:
+    """
+    Пул соединений pg8000.
+    Соединение вместе с его подготовленными запросами переиспользуется
+    между вызовами, вместо нового подключения на каждую функцию.
+    """
+
+    def __init__(self, url, size, timeout):
+        self.url = url
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+
+    @property
+    def in_use(self):
+        return self._created - self._idle.qsize()
+
+    @property
+    def idle(self):
+        return self._idle.qsize()
+
+    def acquire(self):
+        count_connection()
+        with span("db.acquire"):
+            return self._acquire()
+
+    def _acquire(self):
+        try:
+            raw, statements = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+
+            if can_create:
+                try:
+                    raw, statements = self._connect(), {}
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                try:
+                    raw, statements = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise PoolExhausted("Нет свободных соединений с базой данных")
+
+        return PooledConnection(self, raw, statements)
+
+    def _connect(self):
+        if not self.url:
+            raise RuntimeError("DATABASE_URL не установлен в .env файле")
+
+        db_config = parse_database_url(self.url)
+
+        try:
+            return pg8000.connect(**db_config)
+        except pg8000.Error as exc:
+            raise RuntimeError("Ошибка подключения к базе данных") from exc
+
+    def release(self, raw, statements, broken=False):
+        if broken:
+            with self._lock:
+                self._created -= 1
+            try:
+                raw.close()
+            except Exception:
+                pass
+            return
+
+        self._idle.put((raw, statements))
+
+    def close_all(self):
+        """Закрывает все свободные соединения пула."""
+        while True:
+            try:
+                raw, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self.release(raw, None, broken=True)
+
+
+class PooledConnection:
+    """
+    Соединение, выданное пулом. close() откатывает незавершённую
+    транзакцию и возвращает соединение в пул.
+    """
+
+    def __init__(self, pool, raw, statements):
+        self._pool = pool
+        self._raw = raw
+        self._statements = statements
+        self._closed = False
+
+    def cursor(self):
+        return CountingCursor(self._raw.cursor())
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def prepared(self, sql):
+        """
+        Подготовленный запрос (параметры в виде :name), создаётся один раз
+        на соединение пула и дальше выполняется без повторного разбора и планирования.
+        """
+        statement = self._statements.get(sql)
+        if statement is None:
+            statement = self._raw.prepare(sql)
+            self._statements[sql] = statement
+        return statement
+
+    def run(self, sql, **params):
+        """Выполняет подготовленный запрос и возвращает строки."""
+        count_query()
+        with span("db.query", sql=" ".join(sql.split())[:80]):
+            return self.prepared(sql).run(**params)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+
+        broken = False
+        try:
+            self._raw.rollback()
+        except Exception:
+            broken = True
+
+        self._pool.release(self._raw, self._statements, broken=broken)
+
+
+class CountingCursor:
+    """
+    Курсор pg8000, который учитывает выполненные запросы (см. query_budget)
+    и записывает их в трассировку, как PooledConnection.run.
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, *args, **kwargs):
+        count_query()
+        with span("db.query", sql=" ".join(sql.split())[:80]):
+            return self._cursor.execute(sql, *args, **kwargs)
+
+    def executemany(self, sql, *args, **kwargs):
+        count_query()
+        with span("db.query", sql=" ".join(sql.split())[:80]):
+            return self._cursor.executemany(sql, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+class ReadRouter:
+    """
+    Направляет запросы только на чтение на реплики по кругу.
+    Недоступные или отстающие реплики пропускаются до следующей проверки,
+    а чтения пользователя сразу после его записи идут на основную БД.
+    """
+
+    def __init__(self, primary, urls):
+        self.primary = primary
+        self.replicas = [ConnectionPool(url, DB_POOL_SIZE, DB_POOL_TIMEOUT) for url in urls]
+        self._unhealthy_until = {}
+        self._turn = itertools.count()
+        self._recent_writes = {}
+        self._lock = threading.Lock()
+
+    def note_write(self, user_id):
+        """Запоминает запись пользователя для окна read-your-writes."""
+        if not self.replicas or user_id is None:
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            self._recent_writes[user_id] = now
+            if len(self._recent_writes) > 10000:
+                self._recent_writes = {
+                    uid: ts
+                    for uid, ts in self._recent_writes.items()
+                    if now - ts < READ_YOUR_WRITES_SECONDS
+                }
+
+    def _wrote_recently(self, user_id):
+        written_at = self._recent_writes.get(user_id)
+        return (
+            written_at is not None
+            and time.monotonic() - written_at < READ_YOUR_WRITES_SECONDS
+        )
+
+    def _mark_unhealthy(self, replica, reason):
+        self._unhealthy_until[replica] = time.monotonic() + REPLICA_RETRY_SECONDS
+        replica.close_all()
+        print(f"⚠️ Реплика {replica.url.split('@')[-1]} исключена: {reason}")
+
+    def acquire(self, user_id=None):
+        if not self.replicas or (user_id is not None and self._wrote_recently(user_id)):
+            return self.primary.acquire()
+
+        now = time.monotonic()
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[next(self._turn) % len(self.replicas)]
+            if self._unhealthy_until.get(replica, 0) > now:
+                continue
+
+            try:
+                return replica.acquire()
+            except PoolExhausted:
+                # Реплика занята, но жива - пробуем следующую
+                continue
+            except RuntimeError as e:
+                self._mark_unhealthy(replica, e)
+
+        # Все реплики недоступны - читаем с основной БД
+        return self.primary.acquire()
+
+    def check_replicas(self):
+        """Проверка реплик: доступность и отставание репликации."""
+        for replica in self.replicas:
+            try:
+                conn = replica.acquire()
+            except PoolExhausted:
+                continue
+            except RuntimeError as e:
+                self._mark_unhealthy(replica, e)
+                continue
+
+            try:
+                rows = conn.run(
+                    """
+                    SELECT CASE
+                        -- Всё полученное применено: время последней транзакции
+                        -- растёт, только если на основной БД нет записей
+                        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                        ELSE COALESCE(
+                            EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0
+                        )
+                    END::FLOAT8
+                    """
+                )
+                lag = rows[0][0]
+            except Exception as e:
+                conn.close()
+                self._mark_unhealthy(replica, e)
+                continue
+
+            conn.close()
+            if lag > REPLICA_MAX_LAG_SECONDS:
+                self._mark_unhealthy(replica, f"отставание {lag:.1f} с")
+            else:
+                self._unhealthy_until.pop(replica, None)
+
+    def close_all(self):
+        for replica in self.replicas:
+            replica.close_all()
+
+
+_pool = ConnectionPool(DATABASE_URL, DB_POOL_SIZE, DB_POOL_TIMEOUT)
+_read_router = ReadRouter(_pool, DATABASE_READ_URLS)
+
+db_call_seconds = Histogram(
+    "bot_db_call_seconds", "Длительность функций database.py", labels=("function",)
+)
+Gauge("bot_db_pool_in_use", "Соединения основного пула, выданные сейчас").set_function(
+    lambda: _pool.in_use
+)
+Gauge("bot_db_pool_idle", "Свободные соединения основного пула").set_function(
+    lambda: _pool.idle
+)
+
+
 def get_connection():
-    """Создаёт соединение с базой данных."""
-    db_config = parse_database_url(DATABASE_URL)
+    """Берёт соединение с базой данных из пула (close() возвращает его обратно)."""
+    return _pool.acquire()
 
-    try:
-        return pg8000.connect(**db_config)
-    except pg8000.Error as exc:
-        raise RuntimeError("Ошибка подключения к базе данных") from exc
+
+def get_read_connection(user_id=None):
+    """
+    Соединение для запросов только на чтение: реплика, если они настроены,
+    иначе основная БД. user_id нужен для правила read-your-writes.
+    """
+    return _read_router.acquire(user_id)
+
+
+def note_user_write(user_id):
+    """Отмечает запись пользователя: его ближайшие чтения пойдут на основную БД."""
+    _read_router.note_write(user_id)
+
+
+def check_read_replicas():
+    """Проверяет реплики (вызывается планировщиком)."""
+    _read_router.check_replicas()
+
+
+def close_pool():
+    """Закрывает соединения пула (при остановке бота)."""
+    _pool.close_all()
+    _read_router.close_all()
+
+
+# Подписчики на изменения каталога фраз: событие -> список функций.
+# "phrases_added" получает список новых фраз (словари),
+# "phrases_deleted" - список phrase_id удалённых личных фраз,
+# "user_phrases_changed" - user_id, у которого изменился набор фраз или колода.
+_listeners = {}
+
+# Индекс похожих фраз для get_wrong_phrases (см. similarity.py)
+_distractor_index = None
+
+# Кэш get_catalog_decks: (момент устаревания по time.monotonic(), строки)
+_catalog_decks = (0.0, None)
+
+
+def subscribe(event, callback):
+    """Подписывает функцию на событие каталога фраз."""
+    _listeners.setdefault(event, []).append(callback)
+
+
+def _emit(event, payload):
+    for callback in list(_listeners.get(event, ())):
+        try:
+            callback(payload)
+        except Exception as e:
+            print(f"⚠️ Ошибка обработчика события {event}: {e}")
+
+
+def set_distractor_index(index):
+    """Подключает индекс похожих фраз к выбору неправильных вариантов."""
+    global _distractor_index
+    _distractor_index = index
 
 
 def row_to_dict(row, columns):
@@ -43,123 +399,441 @@ def init_db():
     conn = get_connection()
     cur = conn.cursor()
 
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS users (
-            user_id BIGINT PRIMARY KEY,
-            username VARCHAR(100),
-            first_name VARCHAR(100),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    try:
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                user_id BIGINT PRIMARY KEY,
+                username VARCHAR(100),
+                first_name VARCHAR(100),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """
         )
-        """
-    )
 
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS phrases (
-            phrase_id SERIAL PRIMARY KEY,
-            english_phrase TEXT NOT NULL,
-            russian_translation TEXT NOT NULL,
-            category VARCHAR(100),
-            level VARCHAR(10),
-            example TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE (english_phrase, russian_translation)
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS phrases (
+                phrase_id SERIAL PRIMARY KEY,
+                english_phrase TEXT NOT NULL,
+                russian_translation TEXT NOT NULL,
+                category VARCHAR(100),
+                level VARCHAR(10),
+                example TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (english_phrase, russian_translation)
+            )
+            """
         )
-        """
-    )
 
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS user_phrases (
-            user_phrase_id SERIAL PRIMARY KEY,
-            user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
-            phrase_id INTEGER REFERENCES phrases(phrase_id) ON DELETE CASCADE,
-            correct_answers INTEGER DEFAULT 0,
-            is_learned BOOLEAN DEFAULT FALSE,
-            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE (user_id, phrase_id)
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS user_phrases (
+                user_phrase_id SERIAL PRIMARY KEY,
+                user_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
+                phrase_id INTEGER REFERENCES phrases(phrase_id) ON DELETE CASCADE,
+                correct_answers INTEGER DEFAULT 0,
+                is_learned BOOLEAN DEFAULT FALSE,
+                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (user_id, phrase_id)
+            )
+            """
         )
-        """
-    )
 
-    conn.commit()
-    cur.close()
-    conn.close()
+        cur.execute("SELECT to_regclass('user_stats') IS NULL")
+        needs_backfill = cur.fetchone()[0]
+
+        # Счётчики для /stats, обновляются в тех же транзакциях, что и прогресс
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS user_stats (
+                user_id BIGINT PRIMARY KEY REFERENCES users(user_id) ON DELETE CASCADE,
+                total_phrases INTEGER NOT NULL DEFAULT 0,
+                learned_phrases INTEGER NOT NULL DEFAULT 0,
+                streak_days INTEGER NOT NULL DEFAULT 0,
+                answers_today INTEGER NOT NULL DEFAULT 0,
+                last_answer_date DATE
+            )
+            """
+        )
 
+        if needs_backfill:
+            cur.execute(
+                """
+                INSERT INTO user_stats (user_id, total_phrases, learned_phrases)
+                SELECT user_id, COUNT(*), COUNT(*) FILTER (WHERE is_learned)
+                FROM user_phrases
+                WHERE user_id IS NOT NULL
+                GROUP BY user_id
+                ON CONFLICT (user_id) DO NOTHING
+                """
+            )
 
-def add_user(user_id, username, first_name):
+        # Снимок агрегатов для /users, обновляется по расписанию
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS admin_stats (
+                snapshot_id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (snapshot_id = 1),
+                total_users BIGINT NOT NULL,
+                active_users BIGINT NOT NULL,
+                total_phrases BIGINT NOT NULL,
+                user_phrases BIGINT NOT NULL,
+                refreshed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+
+        conn.commit()
+
+        # Индексы и прочие изменения схемы
+        apply_migrations(conn)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+    ensure_impression_partitions()
+
+
+@timed(db_call_seconds)
+def ensure_impression_partitions(months_ahead=2):
+    """
+    Создаёт месячные секции card_impressions на текущий и следующие месяцы.
+    Вызывается при старте и ежедневно планировщиком.
+    """
     conn = get_connection()
     cur = conn.cursor()
 
-    cur.execute(
-        """
-        INSERT INTO users (user_id, username, first_name)
-        VALUES (%s, %s, %s)
-        ON CONFLICT (user_id) DO NOTHING
-        """,
-        (user_id, username, first_name),
-    )
+    month_start = date.today().replace(day=1)
 
-    conn.commit()
-    cur.close()
-    conn.close()
+    try:
+        for _ in range(months_ahead + 1):
+            next_month = (month_start.replace(day=28) + timedelta(days=4)).replace(day=1)
+            partition = f"card_impressions_{month_start:%Y%m}"
+
+            try:
+                cur.execute(
+                    f"""
+                    CREATE TABLE IF NOT EXISTS {partition}
+                    PARTITION OF card_impressions
+                    FOR VALUES FROM ('{month_start}') TO ('{next_month}')
+                    """
+                )
+                conn.commit()
+            except pg8000.Error as e:
+                # Например, строки за этот месяц уже попали в секцию по умолчанию
+                conn.rollback()
+                print(f"⚠️ Не удалось создать секцию {partition}: {e}")
 
+            month_start = next_month
+    finally:
+        cur.close()
+        conn.close()
 
 
+def _update_user_stats(conn, user_id, total_delta=0, learned_delta=0):
+    """Сдвигает счётчики фраз пользователя (внутри текущей транзакции)."""
+    if not total_delta and not learned_delta:
+        return
 
-def get_random_phrase_for_user(user_id):
+    conn.run(
+        """
+        INSERT INTO user_stats (user_id, total_phrases, learned_phrases)
+        VALUES (:user_id, GREATEST(:total_delta, 0), GREATEST(:learned_delta, 0))
+        ON CONFLICT (user_id) DO UPDATE SET
+            total_phrases = GREATEST(user_stats.total_phrases + :total_delta, 0),
+            learned_phrases = GREATEST(user_stats.learned_phrases + :learned_delta, 0)
+        """,
+        user_id=user_id,
+        total_delta=total_delta,
+        learned_delta=learned_delta,
+    )
+
+
+@timed(db_call_seconds)
+def add_user(user_id, username, first_name):
     conn = get_connection()
     cur = conn.cursor()
 
     try:
         cur.execute(
             """
-            SELECT p.phrase_id, p.english_phrase, p.russian_translation
-            FROM phrases p
-            LEFT JOIN user_phrases up
-              ON up.phrase_id = p.phrase_id AND up.user_id = %s
-            WHERE up.is_learned IS NULL OR up.is_learned = FALSE
-            ORDER BY COALESCE(up.correct_answers, 0) ASC, RANDOM()
-            LIMIT 1
+            INSERT INTO users (user_id, username, first_name)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (user_id) DO NOTHING
             """,
-            (user_id,),
-        )
-
-        row = cur.fetchone()
-        return (
-            row_to_dict(row, ["phrase_id", "english_phrase", "russian_translation"])
-            if row
-            else None
+            (user_id, username, first_name),
         )
 
+        conn.commit()
+        note_user_write(user_id)
+    except Exception:
+        conn.rollback()
+        raise
     finally:
         cur.close()
         conn.close()
 
 
+def _deck_filter(category=None, level=None):
+    """
+    Условие на колоду и уровень для запросов к phrases и его параметры.
+    Для каждого сочетания фильтров получается свой текст запроса,
+    поэтому подготовленный запрос всегда идёт по подходящему индексу.
+    """
+    conditions = ""
+    params = {}
+    if category is not None:
+        conditions += " AND category = :category"
+        params["category"] = category
+    if level is not None:
+        conditions += " AND level = :level"
+        params["level"] = level
+    return conditions, params
+
+
+# Тексты горячих запросов (их планы проверяет migrations.test_query_plans)
+STUDY_SETTINGS_SQL = """
+    SELECT last_shown_phrase_id, study_category, study_level
+    FROM users
+    WHERE user_id = :user_id
+"""
+
+
+@timed(db_call_seconds)
+def get_study_settings(user_id):
+    """
+    Последняя показанная фраза и выбранные колода и уровень одним чтением:
+    {"last_phrase_id", "category", "level"} (None - не задано).
+    """
+    conn = get_read_connection(user_id)
+    try:
+        rows = conn.run(STUDY_SETTINGS_SQL, user_id=user_id)
+        return row_to_dict(
+            rows[0] if rows else (None, None, None),
+            ["last_phrase_id", "category", "level"],
+        )
+    finally:
+        conn.close()
 
 
-
-def get_wrong_phrases(correct_phrase_id, user_id, limit=3):
-    """Возвращает уникальные неправильные варианты."""
+@timed(db_call_seconds)
+def set_study_deck(user_id, category=None, level=None):
+    """Сохраняет выбранные колоду и уровень (None - все)."""
     conn = get_connection()
-    cur = conn.cursor()
-
     try:
-        # Получаем больше вариантов, чтобы гарантировать уникальность
-        cur.execute(
+        conn.run(
             """
-            SELECT phrase_id, english_phrase, russian_translation
-            FROM phrases
-            WHERE phrase_id != %s
-            ORDER BY RANDOM()
-            LIMIT %s
+            UPDATE users
+            SET study_category = :category, study_level = :level
+            WHERE user_id = :user_id
             """,
-            (correct_phrase_id, limit * 3),  # Увеличиваем лимит
+            user_id=user_id,
+            category=category,
+            level=level,
         )
+        conn.commit()
+        note_user_write(user_id)
+        _emit("user_phrases_changed", user_id)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+CATALOG_DECKS_SQL = """
+    SELECT category, level, COUNT(*)
+    FROM phrases
+    WHERE owner_id IS NULL
+    GROUP BY category, level
+    ORDER BY category, level
+"""
+
+
+@timed(db_call_seconds)
+def get_catalog_decks():
+    """
+    Колоды общего каталога: список (category, level, число фраз).
+    Запрос читает весь каталог, поэтому результат кэшируется
+    на CATALOG_DECKS_CACHE_SECONDS.
+    """
+    global _catalog_decks
+    expires_at, decks = _catalog_decks
+    if decks is not None and time.monotonic() < expires_at:
+        return decks
+
+    conn = get_read_connection()
+    try:
+        decks = conn.run(CATALOG_DECKS_SQL)
+    finally:
+        conn.close()
+    _catalog_decks = (time.monotonic() + CATALOG_DECKS_CACHE_SECONDS, decks)
+    return decks
+
+
+@timed(db_call_seconds)
+def get_random_phrase_for_user(user_id, exclude_phrase_id=None, category=None, level=None):
+    """
+    Случайная неизученная фраза (сначала с наименьшим числом правильных ответов)
+    из общего каталога и личных фраз пользователя; чужие личные фразы не читаются.
+    exclude_phrase_id - фраза, которую не нужно показывать (например, последняя).
+    category и level ограничивают выбор колодой и уровнем (личные фразы - колода custom).
+    """
+    exclude = [] if exclude_phrase_id is None else [exclude_phrase_id]
+    phrases = _select_study_phrases(user_id, 1, exclude, category, level)
+    return phrases[0] if phrases else None
+
+
+@timed(db_call_seconds)
+def get_random_phrases_for_user(
+    user_id, limit, exclude_phrase_ids=(), category=None, level=None
+):
+    """
+    Несколько следующих карточек сразу (для очереди study_queue.py):
+    до limit разных фраз в том же порядке, что и get_random_phrase_for_user.
+    """
+    return _select_study_phrases(
+        user_id, limit, list(exclude_phrase_ids), category, level
+    )
+
+
+# Не показанные пользователю фразы общего каталога: отрезок индекса random_key
+# со случайной точки (с переходом через начало), как в CATALOG_SLICE_SQL
+_FRESH_PHRASES_SQL = """
+        SELECT p.phrase_id, p.english_phrase, p.russian_translation
+        FROM phrases p
+        WHERE p.owner_id IS NULL{deck_filter}
+          AND p.random_key {op} :start_key
+          AND p.phrase_id <> ALL (CAST(:exclude_phrase_ids AS INTEGER[]))
+          AND NOT EXISTS (
+              SELECT 1
+              FROM user_phrases seen
+              WHERE seen.user_id = :user_id AND seen.phrase_id = p.phrase_id
+          )
+        ORDER BY p.random_key
+        LIMIT :limit
+"""
+
+# {deck_filter} - условие _deck_filter(). Кандидаты - начатые неизученные
+# фразы пользователя (общие и личные) и случайный отрезок ещё не показанных
+# фраз каталога; оба читаются по индексам, без сортировки всего каталога.
+STUDY_PHRASES_SQL = (
+    """
+    SELECT phrase_id, english_phrase, russian_translation
+    FROM (
+        SELECT p.phrase_id, p.english_phrase, p.russian_translation,
+               up.correct_answers
+        FROM user_phrases up
+        JOIN phrases p ON p.phrase_id = up.phrase_id
+        WHERE up.user_id = :user_id
+          AND up.is_learned IS NOT TRUE
+          AND (p.owner_id IS NULL OR p.owner_id = :user_id){deck_filter}
+          AND p.phrase_id <> ALL (CAST(:exclude_phrase_ids AS INTEGER[]))
+        UNION ALL
+        SELECT phrase_id, english_phrase, russian_translation, 0
+        FROM (
+            ("""
+    + _FRESH_PHRASES_SQL.replace("{op}", ">=")
+    + """)
+            UNION ALL
+            ("""
+    + _FRESH_PHRASES_SQL.replace("{op}", "<")
+    + """)
+            LIMIT :limit
+        ) fresh
+    ) candidates
+    ORDER BY COALESCE(correct_answers, 0) ASC, RANDOM()
+    LIMIT :limit
+"""
+)
+
+
+def _select_study_phrases(user_id, limit, exclude_phrase_ids, category, level):
+    deck_filter, deck_params = _deck_filter(category, level)
+    conn = get_read_connection(user_id)
+
+    try:
+        rows = conn.run(
+            STUDY_PHRASES_SQL.format(deck_filter=deck_filter),
+            user_id=user_id,
+            exclude_phrase_ids=exclude_phrase_ids,
+            limit=limit,
+            start_key=random.random(),
+            **deck_params,
+        )
+
+        return [
+            row_to_dict(row, ["phrase_id", "english_phrase", "russian_translation"])
+            for row in rows
+        ]
+
+    finally:
+        conn.close()
+
+
+# {deck_filter} - условие _deck_filter()
+CATALOG_SLICE_SQL = """
+    (
+        SELECT phrase_id, english_phrase, russian_translation
+        FROM phrases
+        WHERE owner_id IS NULL{deck_filter}
+          AND phrase_id != :phrase_id AND random_key >= :start_key
+        ORDER BY random_key
+        LIMIT :fetch_limit
+    )
+    UNION ALL
+    (
+        SELECT phrase_id, english_phrase, russian_translation
+        FROM phrases
+        WHERE owner_id IS NULL{deck_filter}
+          AND phrase_id != :phrase_id AND random_key < :start_key
+        ORDER BY random_key
+        LIMIT :fetch_limit
+    )
+    LIMIT :fetch_limit
+"""
+
+
+def _random_catalog_slice(conn, phrase_id, fetch_limit, category=None, level=None):
+    """
+    Отрезок индекса random_key общего каталога со случайной точки
+    (с переходом через начало) вместо ORDER BY RANDOM() по всей таблице.
+    """
+    deck_filter, deck_params = _deck_filter(category, level)
+    return conn.run(
+        CATALOG_SLICE_SQL.format(deck_filter=deck_filter),
+        phrase_id=phrase_id,
+        start_key=random.random(),
+        fetch_limit=fetch_limit,
+        **deck_params,
+    )
+
+
+@timed(db_call_seconds)
+def get_wrong_phrases(correct_phrase_id, user_id, limit=3, category=None, level=None):
+    """
+    Возвращает уникальные неправильные варианты: похожие на правильную фразу
+    из индекса similarity.py, а пока он не построен - случайные из колоды
+    (category, level) общего каталога.
+    """
+    if _distractor_index is not None:
+        result = _distractor_index.distractors(correct_phrase_id, limit, user_id)
+        if result is not None:
+            return result
+
+    conn = get_read_connection()
+
+    try:
+        # Получаем больше вариантов, чтобы гарантировать уникальность
+        fetch_limit = limit * 3
+        rows = _random_catalog_slice(conn, correct_phrase_id, fetch_limit, category, level)
+        if len(rows) < fetch_limit and (category is not None or level is not None):
+            # В узкой колоде вариантов может не хватить - добираем из всего каталога
+            rows = list(rows) + list(_random_catalog_slice(conn, correct_phrase_id, fetch_limit))
 
-        rows = cur.fetchall()
         seen_ids = set()
         seen_texts = set()
         result = []
@@ -186,83 +860,174 @@ def get_wrong_phrases(correct_phrase_id, user_id, limit=3):
         return result
 
     finally:
-        cur.close()
         conn.close()
 
 
+@timed(db_call_seconds)
 def update_user_progress(user_id, phrase_id, is_correct):
     conn = get_connection()
-    cur = conn.cursor()
 
     try:
-        cur.execute(
+        # Строка блокируется до конца транзакции: параллельные ответы
+        # пользователя (несколько обработчиков) применяются по очереди,
+        # иначе оба посчитали бы один и тот же переход в «изучено»
+        rows = conn.run(
             """
-            SELECT correct_answers
+            SELECT correct_answers, is_learned
             FROM user_phrases
-            WHERE user_id = %s AND phrase_id = %s
+            WHERE user_id = :user_id AND phrase_id = :phrase_id
+            FOR UPDATE
             """,
-            (user_id, phrase_id),
+            user_id=user_id,
+            phrase_id=phrase_id,
         )
 
-        row = cur.fetchone()
-        current = row[0] if row else 0
+        new_link = False
+        if not rows:
+            # Фраза ещё не привязана (обычно это делает mark_phrase_shown)
+            rows = conn.run(
+                """
+                INSERT INTO user_phrases (user_id, phrase_id)
+                VALUES (:user_id, :phrase_id)
+                ON CONFLICT (user_id, phrase_id) DO NOTHING
+                RETURNING correct_answers, is_learned
+                """,
+                user_id=user_id,
+                phrase_id=phrase_id,
+            )
+            new_link = bool(rows)
+            if not new_link:
+                # Строку только что вставил параллельный ответ - ждём его
+                rows = conn.run(
+                    """
+                    SELECT correct_answers, is_learned
+                    FROM user_phrases
+                    WHERE user_id = :user_id AND phrase_id = :phrase_id
+                    FOR UPDATE
+                    """,
+                    user_id=user_id,
+                    phrase_id=phrase_id,
+                )
+
+        current, was_learned = rows[0]
+        was_learned = bool(was_learned)
 
         current = current + 1 if is_correct else max(0, current - 1)
         is_learned = current >= LEARNED_THRESHOLD
 
-        cur.execute(
+        conn.run(
             """
-            INSERT INTO user_phrases (user_id, phrase_id, correct_answers, is_learned)
-            VALUES (%s, %s, %s, %s)
-            ON CONFLICT (user_id, phrase_id)
-            DO UPDATE SET correct_answers = %s, is_learned = %s
+            UPDATE user_phrases
+            SET correct_answers = :correct_answers, is_learned = :is_learned
+            WHERE user_id = :user_id AND phrase_id = :phrase_id
             """,
-            (
-                user_id,
-                phrase_id,
-                current,
-                is_learned,
-                current,
-                is_learned,
-            ),
+            user_id=user_id,
+            phrase_id=phrase_id,
+            correct_answers=current,
+            is_learned=is_learned,
+        )
+
+        # Счётчики /stats: изученные фразы, серия дней и ответы за сегодня
+        conn.run(
+            """
+            INSERT INTO user_stats (
+                user_id, total_phrases, learned_phrases,
+                streak_days, answers_today, last_answer_date
+            )
+            VALUES (:user_id, :total_delta, GREATEST(:learned_delta, 0), 1, 1, CURRENT_DATE)
+            ON CONFLICT (user_id) DO UPDATE SET
+                total_phrases = user_stats.total_phrases + :total_delta,
+                learned_phrases = GREATEST(user_stats.learned_phrases + :learned_delta, 0),
+                streak_days = CASE
+                    WHEN user_stats.last_answer_date = CURRENT_DATE
+                        THEN user_stats.streak_days
+                    WHEN user_stats.last_answer_date = CURRENT_DATE - 1
+                        THEN user_stats.streak_days + 1
+                    ELSE 1
+                END,
+                answers_today = CASE
+                    WHEN user_stats.last_answer_date = CURRENT_DATE
+                        THEN user_stats.answers_today + 1
+                    ELSE 1
+                END,
+                last_answer_date = CURRENT_DATE
+            """,
+            user_id=user_id,
+            total_delta=int(new_link),
+            learned_delta=int(is_learned) - int(was_learned),
         )
 
         conn.commit()
+        note_user_write(user_id)
 
     except Exception:
         conn.rollback()
         raise
     finally:
-        cur.close()
         conn.close()
 
 
+# Фраза из общего каталога или из личных фраз пользователя
+FIND_PHRASE_SQL = """
+    (
+        SELECT phrase_id
+        FROM phrases
+        WHERE owner_id IS NULL
+          AND english_phrase = %s AND russian_translation = %s
+    )
+    UNION ALL
+    (
+        SELECT phrase_id
+        FROM phrases
+        WHERE owner_id = %s
+          AND english_phrase = %s AND russian_translation = %s
+    )
+    LIMIT 1
+"""
+
+FIND_OWN_PHRASE_SQL = """
+    SELECT phrase_id
+    FROM phrases
+    WHERE owner_id = %s AND english_phrase = %s AND russian_translation = %s
+"""
+
+
+@timed(db_call_seconds)
 def add_custom_phrase(user_id, english_phrase, russian_translation):
+    """
+    Добавляет фразу в набор пользователя. Фраза из общего каталога
+    только привязывается, новая становится личной фразой пользователя.
+    """
     conn = get_connection()
     cur = conn.cursor()
 
     try:
         cur.execute(
-            """
-            INSERT INTO phrases (english_phrase, russian_translation, category, level)
-            VALUES (%s, %s, 'custom', 'B1')
-            ON CONFLICT (english_phrase, russian_translation) DO NOTHING
-            RETURNING phrase_id
-            """,
-            (english_phrase, russian_translation),
+            FIND_PHRASE_SQL,
+            (english_phrase, russian_translation, user_id, english_phrase, russian_translation),
         )
 
         row = cur.fetchone()
+        inserted = False
         if not row:
             cur.execute(
                 """
-                SELECT phrase_id
-                FROM phrases
-                WHERE english_phrase = %s AND russian_translation = %s
+                INSERT INTO phrases
+                    (english_phrase, russian_translation, category, level, owner_id)
+                VALUES (%s, %s, 'custom', 'B1', %s)
+                ON CONFLICT (owner_id, english_phrase, russian_translation)
+                    WHERE owner_id IS NOT NULL DO NOTHING
+                RETURNING phrase_id
                 """,
-                (english_phrase, russian_translation),
+                (english_phrase, russian_translation, user_id),
             )
             row = cur.fetchone()
+            inserted = row is not None
+
+        if not row:
+            # Ту же фразу параллельно добавил другой запрос этого пользователя
+            cur.execute(FIND_OWN_PHRASE_SQL, (user_id, english_phrase, russian_translation))
+            row = cur.fetchone()
 
         if row:
             cur.execute(
@@ -270,11 +1035,28 @@ def add_custom_phrase(user_id, english_phrase, russian_translation):
                 INSERT INTO user_phrases (user_id, phrase_id)
                 VALUES (%s, %s)
                 ON CONFLICT (user_id, phrase_id) DO NOTHING
+                RETURNING phrase_id
                 """,
                 (user_id, row[0]),
             )
+            if cur.fetchone():
+                _update_user_stats(conn, user_id, total_delta=1)
 
         conn.commit()
+        note_user_write(user_id)
+        _emit("user_phrases_changed", user_id)
+        if inserted:
+            _emit(
+                "phrases_added",
+                [
+                    {
+                        "phrase_id": row[0],
+                        "english_phrase": english_phrase,
+                        "russian_translation": russian_translation,
+                        "owner_id": user_id,
+                    }
+                ],
+            )
         return True
 
     except Exception:
@@ -285,88 +1067,393 @@ def add_custom_phrase(user_id, english_phrase, russian_translation):
         conn.close()
 
 
+@timed(db_call_seconds)
+def add_custom_phrases_bulk(user_id, phrases):
+    """
+    Добавляет много фраз пользователя одной транзакцией:
+    один многострочный upsert в phrases и одна вставка в user_phrases.
+    Фразы из общего каталога только привязываются, остальные становятся личными.
+    phrases - список пар (english_phrase, russian_translation).
+    Возвращает количество фраз, добавленных в набор пользователя.
+    """
+    # ON CONFLICT не может дважды затронуть одну строку - убираем дубли заранее
+    unique_phrases = list(dict.fromkeys(phrases))
+    if not unique_phrases:
+        return 0
+
+    conn = get_connection()
+    cur = conn.cursor()
+
+    try:
+        cur.execute(
+            """
+            WITH input AS (
+                SELECT *
+                FROM unnest(%s::TEXT[], %s::TEXT[])
+                     AS t(english_phrase, russian_translation)
+            ),
+            existing AS (
+                SELECT p.phrase_id, p.english_phrase, p.russian_translation
+                FROM phrases p
+                JOIN input i USING (english_phrase, russian_translation)
+                WHERE p.owner_id IS NULL
+                UNION ALL
+                SELECT p.phrase_id, p.english_phrase, p.russian_translation
+                FROM phrases p
+                JOIN input i USING (english_phrase, russian_translation)
+                WHERE p.owner_id = %s
+            ),
+            inserted AS (
+                INSERT INTO phrases
+                    (english_phrase, russian_translation, category, level, owner_id)
+                SELECT english_phrase, russian_translation, 'custom', 'B1', %s
+                FROM input i
+                WHERE NOT EXISTS (
+                    SELECT 1
+                    FROM existing e
+                    WHERE e.english_phrase = i.english_phrase
+                      AND e.russian_translation = i.russian_translation
+                )
+                ON CONFLICT (owner_id, english_phrase, russian_translation)
+                    WHERE owner_id IS NOT NULL DO NOTHING
+                RETURNING phrase_id, english_phrase, russian_translation
+            ),
+            phrase_ids AS (
+                SELECT phrase_id FROM inserted
+                UNION
+                SELECT phrase_id FROM existing
+            ),
+            linked AS (
+                INSERT INTO user_phrases (user_id, phrase_id)
+                SELECT %s, phrase_id FROM phrase_ids
+                ON CONFLICT (user_id, phrase_id) DO NOTHING
+                RETURNING phrase_id
+            )
+            SELECT (SELECT COUNT(*) FROM linked),
+                   ARRAY(SELECT phrase_id FROM inserted),
+                   ARRAY(SELECT english_phrase FROM inserted),
+                   ARRAY(SELECT russian_translation FROM inserted)
+            """,
+            (
+                [english for english, _ in unique_phrases],
+                [russian for _, russian in unique_phrases],
+                user_id,
+                user_id,
+                user_id,
+            ),
+        )
+
+        added, *inserted = cur.fetchone()
+        _update_user_stats(conn, user_id, total_delta=added)
+
+        conn.commit()
+        note_user_write(user_id)
+        if added:
+            _emit("user_phrases_changed", user_id)
+        if inserted[0]:
+            _emit(
+                "phrases_added",
+                [
+                    row_to_dict(
+                        (*row, user_id),
+                        ["phrase_id", "english_phrase", "russian_translation", "owner_id"],
+                    )
+                    for row in zip(*inserted)
+                ],
+            )
+        return added
+
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+
+@timed(db_call_seconds)
 def delete_user_phrase(user_id, phrase_id):
+    """
+    Удаляет фразу из набора пользователя одним запросом.
+    Личная фраза пользователя удаляется из каталога целиком.
+    Возвращает удалённую фразу (english_phrase, russian_translation) или None.
+    """
     conn = get_connection()
     cur = conn.cursor()
 
-    cur.execute(
-        """
-        DELETE FROM user_phrases
-        WHERE user_id = %s AND phrase_id = %s
-        """,
-        (user_id, phrase_id),
-    )
+    try:
+        cur.execute(
+            """
+            WITH removed AS (
+                DELETE FROM user_phrases up
+                USING phrases p
+                WHERE up.user_id = %s
+                  AND up.phrase_id = %s
+                  AND p.phrase_id = up.phrase_id
+                RETURNING p.english_phrase, p.russian_translation, up.is_learned,
+                          p.owner_id
+            ),
+            dropped AS (
+                DELETE FROM phrases
+                WHERE phrase_id = %s
+                  AND owner_id = %s
+                  AND EXISTS (SELECT 1 FROM removed)
+                RETURNING phrase_id
+            )
+            SELECT english_phrase, russian_translation, is_learned,
+                   EXISTS (SELECT 1 FROM dropped)
+            FROM removed
+            """,
+            (user_id, phrase_id, phrase_id, user_id),
+        )
+
+        row = cur.fetchone()
+        if row:
+            _update_user_stats(
+                conn, user_id, total_delta=-1, learned_delta=-1 if row[2] else 0
+            )
+
+        conn.commit()
+        note_user_write(user_id)
+        if row:
+            _emit("user_phrases_changed", user_id)
+        if row and row[3]:
+            _emit("phrases_deleted", [phrase_id])
+        return (
+            row_to_dict(row, ["english_phrase", "russian_translation"]) if row else None
+        )
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+
+USER_STATS_SQL = """
+    SELECT total_phrases,
+           learned_phrases,
+           CASE WHEN last_answer_date >= CURRENT_DATE - 1
+                THEN streak_days ELSE 0 END,
+           CASE WHEN last_answer_date = CURRENT_DATE
+                THEN answers_today ELSE 0 END
+    FROM user_stats
+    WHERE user_id = :user_id
+"""
+
 
-    conn.commit()
-    cur.close()
-    conn.close()
+@timed(db_call_seconds)
+def get_user_stats(user_id):
+    """
+    Счётчики пользователя для /stats одним чтением по первичному ключу:
+    всего фраз, изучено, серия дней подряд и ответов за сегодня.
+    """
+    conn = get_read_connection(user_id)
+
+    try:
+        rows = conn.run(USER_STATS_SQL, user_id=user_id)
+
+        columns = ["total_phrases", "learned_phrases", "streak_days", "answers_today"]
+        return row_to_dict(rows[0], columns) if rows else dict.fromkeys(columns, 0)
+    finally:
+        conn.close()
 
 
 def get_user_phrase_count(user_id):
-    conn = get_connection()
+    return get_user_stats(user_id)["total_phrases"]
+
+
+# {keyset} - пусто или USER_PHRASES_KEYSET_SQL, {order} - ASC или DESC
+USER_PHRASES_PAGE_SQL = """
+    SELECT p.phrase_id, p.english_phrase, p.russian_translation,
+           up.correct_answers, up.is_learned
+    FROM user_phrases up
+    JOIN phrases p ON up.phrase_id = p.phrase_id
+    WHERE up.user_id = %s{keyset}
+    ORDER BY up.added_at {order}, up.phrase_id {order}
+    LIMIT %s
+"""
+
+# {op} - < для следующей страницы, > для предыдущей
+USER_PHRASES_KEYSET_SQL = """
+      AND (up.added_at, up.phrase_id) {op} (
+          SELECT added_at, phrase_id
+          FROM user_phrases
+          WHERE user_id = %s AND phrase_id = %s
+      )"""
+
+
+@timed(db_call_seconds)
+def get_user_phrases_page(user_id, limit=20, after_phrase_id=None, before_phrase_id=None):
+    """
+    Страница фраз пользователя (новые сверху) с keyset-пагинацией по (added_at, phrase_id).
+    after_phrase_id - страница после указанной фразы, before_phrase_id - перед ней.
+    Стоимость запроса не зависит от размера набора.
+    Возвращает {"phrases": [...], "has_next": bool, "has_prev": bool}.
+    """
+    cursor_id = after_phrase_id if after_phrase_id is not None else before_phrase_id
+    backwards = after_phrase_id is None and before_phrase_id is not None
+
+    keyset = ""
+    params = [user_id]
+
+    if cursor_id is not None:
+        keyset = USER_PHRASES_KEYSET_SQL.format(op=">" if backwards else "<")
+        params += [user_id, cursor_id]
+
+    query = USER_PHRASES_PAGE_SQL.format(
+        keyset=keyset, order="ASC" if backwards else "DESC"
+    )
+    params.append(limit + 1)
+
+    conn = get_read_connection(user_id)
     cur = conn.cursor()
 
+    try:
+        cur.execute(query, params)
+        rows = cur.fetchall()
+    finally:
+        cur.close()
+        conn.close()
+
+    has_more = len(rows) > limit
+    rows = list(rows[:limit])
+    if backwards:
+        rows.reverse()
+
+    columns = ['phrase_id', 'english_phrase', 'russian_translation', 'correct_answers', 'is_learned']
+    return {
+        "phrases": [row_to_dict(row, columns) for row in rows],
+        "has_next": True if backwards else has_more,
+        "has_prev": has_more if backwards else cursor_id is not None,
+    }
+
+
+def get_learned_phrases_count(user_id):
+    return get_user_stats(user_id)["learned_phrases"]
+
+
+def _estimate_row_count(cur, table):
+    """
+    Приблизительное число строк по статистике планировщика (pg_class.reltuples).
+    Если таблица ещё не анализировалась, считаем точно.
+    """
     cur.execute(
-        "SELECT COUNT(*) FROM user_phrases WHERE user_id = %s",
-        (user_id,),
+        "SELECT reltuples::BIGINT FROM pg_class WHERE oid = to_regclass(%s)",
+        (table,),
     )
+    row = cur.fetchone()
+    if row and row[0] >= 0:
+        return row[0]
+
+    cur.execute(f"SELECT COUNT(*) FROM {table}")
+    return cur.fetchone()[0]
 
-    count = cur.fetchone()[0]
-    cur.close()
-    conn.close()
-    return count
 
+ADMIN_STATS_COLUMNS = [
+    "total_users",
+    "active_users",
+    "total_phrases",
+    "user_phrases",
+    "refreshed_at",
+]
 
-def get_user_phrases_list(user_id, limit=50):
-    """Возвращает список фраз пользователя для выбора при удалении"""
+
+@timed(db_call_seconds)
+def refresh_admin_stats():
+    """
+    Пересчитывает снимок агрегатов для /users и возвращает его.
+    Вызывается планировщиком, чтобы команда администратора не сканировала таблицы.
+    """
     conn = get_connection()
     cur = conn.cursor()
 
     try:
-        cur.execute("""
-            SELECT p.phrase_id, p.english_phrase, p.russian_translation, 
-                   up.correct_answers, up.is_learned
-            FROM user_phrases up
-            JOIN phrases p ON up.phrase_id = p.phrase_id
-            WHERE up.user_id = %s
-            ORDER BY up.added_at DESC
-            LIMIT %s
-        """, (user_id, limit))
+        cur.execute("SELECT COUNT(*) FROM users")
+        total_users = cur.fetchone()[0]
+
+        cur.execute(
+            """
+            SELECT COUNT(DISTINCT user_id)
+            FROM user_phrases
+            WHERE correct_answers > 0
+            """
+        )
+        active_users = cur.fetchone()[0]
+
+        # Для больших таблиц точное число не нужно
+        total_phrases = _estimate_row_count(cur, "phrases")
+        user_phrases_count = _estimate_row_count(cur, "user_phrases")
 
-        phrases = cur.fetchall()
-        columns = ['phrase_id', 'english_phrase', 'russian_translation', 'correct_answers', 'is_learned']
-        
+        cur.execute(
+            """
+            INSERT INTO admin_stats (
+                snapshot_id, total_users, active_users, total_phrases,
+                user_phrases, refreshed_at
+            )
+            VALUES (1, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (snapshot_id) DO UPDATE SET
+                total_users = EXCLUDED.total_users,
+                active_users = EXCLUDED.active_users,
+                total_phrases = EXCLUDED.total_phrases,
+                user_phrases = EXCLUDED.user_phrases,
+                refreshed_at = EXCLUDED.refreshed_at
+            RETURNING total_users, active_users, total_phrases, user_phrases, refreshed_at
+            """,
+            (total_users, active_users, total_phrases, user_phrases_count),
+        )
+        row = cur.fetchone()
+
+        conn.commit()
+        return row_to_dict(row, ADMIN_STATS_COLUMNS)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
         cur.close()
         conn.close()
-        
-        return [
-            row_to_dict(row, columns)
-            for row in phrases
-        ]
-    except Exception as e:
-        print(f"❌ Ошибка при получении списка фраз пользователя: {e}")
+
+
+@timed(db_call_seconds)
+def get_admin_stats():
+    """Последний снимок агрегатов для /users (при отсутствии - пересчитывает)."""
+    conn = get_read_connection()
+    cur = conn.cursor()
+
+    try:
+        cur.execute(
+            """
+            SELECT total_users, active_users, total_phrases, user_phrases, refreshed_at
+            FROM admin_stats
+            WHERE snapshot_id = 1
+            """
+        )
+        row = cur.fetchone()
+    finally:
         cur.close()
         conn.close()
-        return []
 
+    if not row:
+        # Реплика может ещё не увидеть только что записанный снимок
+        return refresh_admin_stats()
 
-def get_learned_phrases_count(user_id):
-    conn = get_connection()
-    cur = conn.cursor()
+    return row_to_dict(row, ADMIN_STATS_COLUMNS)
 
-    cur.execute(
-        """
-        SELECT COUNT(*)
-        FROM user_phrases
-        WHERE user_id = %s AND is_learned = TRUE
-        """,
-        (user_id,),
-    )
 
-    count = cur.fetchone()[0]
-    cur.close()
-    conn.close()
-    return count
+def get_catalog_phrases():
+    """Все фразы каталога (phrase_id, english_phrase, russian_translation, owner_id)."""
+    conn = get_read_connection()
+
+    try:
+        return conn.run(
+            """
+            SELECT phrase_id, english_phrase, russian_translation, owner_id
+            FROM phrases
+            ORDER BY phrase_id
+            """
+        )
+    finally:
+        conn.close()
 
 
 def load_initial_phrases():
@@ -383,7 +1470,7 @@ def load_initial_phrases():
 
 def debug_user_progress(user_id):
     """Отладочная информация о прогрессе пользователя."""
-    conn = get_connection()
+    conn = get_read_connection(user_id)
     cur = conn.cursor()
 
     try:
@@ -408,45 +1495,54 @@ def debug_user_progress(user_id):
         conn.close()
 
 
+@timed(db_call_seconds)
 def get_last_phrase_id(user_id):
     """Последняя показанная пользователю фраза (или None)."""
-    conn = get_connection()
-    cur = conn.cursor()
+    conn = get_read_connection(user_id)
     try:
-        cur.execute(
-            """
-            SELECT phrase_id
-            FROM user_phrases
-            WHERE user_id = %s
-            ORDER BY added_at DESC
-            LIMIT 1
-            """,
-            (user_id,),
+        rows = conn.run(
+            "SELECT last_shown_phrase_id FROM users WHERE user_id = :user_id",
+            user_id=user_id,
         )
-        row = cur.fetchone()
-        return row[0] if row else None
+        return rows[0][0] if rows else None
     finally:
-        cur.close()
         conn.close()
 
 
+@timed(db_call_seconds)
 def mark_phrase_shown(user_id, phrase_id):
-    """Фиксируем, что фраза показана пользователю (создаём связь user_phrases)."""
+    """
+    Фиксируем показ фразы пользователю: связь user_phrases (при первом показе),
+    запись в журнал card_impressions и последняя показанная фраза в users.
+    """
     conn = get_connection()
-    cur = conn.cursor()
     try:
-        cur.execute(
+        conn.run(
+            "INSERT INTO card_impressions (user_id, phrase_id) VALUES (:user_id, :phrase_id)",
+            user_id=user_id,
+            phrase_id=phrase_id,
+        )
+        conn.run(
+            "UPDATE users SET last_shown_phrase_id = :phrase_id WHERE user_id = :user_id",
+            user_id=user_id,
+            phrase_id=phrase_id,
+        )
+        inserted = conn.run(
             """
             INSERT INTO user_phrases (user_id, phrase_id)
-            VALUES (%s, %s)
+            VALUES (:user_id, :phrase_id)
             ON CONFLICT (user_id, phrase_id) DO NOTHING
+            RETURNING phrase_id
             """,
-            (user_id, phrase_id),
+            user_id=user_id,
+            phrase_id=phrase_id,
         )
+        if inserted:
+            _update_user_stats(conn, user_id, total_delta=1)
         conn.commit()
+        note_user_write(user_id)
     except Exception:
         conn.rollback()
         raise
     finally:
-        cur.close()
         conn.close()
@@ -0,0 +1,262 @@
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from abc import ABC, abstractmethod
+
+import config
+from yandex_api import get_word_definition, parse_dictionary_response
+
+logger = logging.getLogger(__name__)
+
+
+class DictionaryProvider(ABC):
+    """
+    Источник словарных данных.
+    lookup() возвращает результат в формате parse_dictionary_response или None.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def lookup(self, word):
+        """Словарная статья для слова или None."""
+
+
+class YandexDictionaryProvider(DictionaryProvider):
+    """Онлайн-словарь Yandex Dictionary API."""
+
+    name = "yandex"
+
+    def lookup(self, word):
+        return get_word_definition(word)
+
+
+class LocalDictionaryProvider(DictionaryProvider):
+    """
+    Офлайн-словарь из SQLite-файла, собранного build_local_dictionary().
+    Поиск - одно чтение по первичному ключу, без сети и квот.
+    """
+
+    name = "local"
+
+    def __init__(self, path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Файл словаря не найден: {path}")
+
+        self.path = path
+        # sqlite3-соединение нельзя делить между потоками
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            self._local.conn = conn
+        return conn
+
+    def lookup(self, word):
+        if not word or not isinstance(word, str):
+            return None
+
+        row = (
+            self._connection()
+            .execute("SELECT data FROM entries WHERE word = ?", (word.lower().strip(),))
+            .fetchone()
+        )
+        return json.loads(row[0]) if row else None
+
+
+class FallbackDictionaryProvider(DictionaryProvider):
+    """Опрашивает источники по порядку и возвращает первый найденный результат."""
+
+    name = "fallback"
+
+    def __init__(self, providers):
+        self.providers = providers
+
+    def lookup(self, word):
+        for provider in self.providers:
+            try:
+                result = provider.lookup(word)
+            except Exception as e:
+                logger.error(f"Ошибка словаря '{provider.name}' для '{word}': {e}")
+                continue
+
+            if result:
+                return result
+
+        return None
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_dictionary_provider():
+    """
+    Возвращает источник словаря согласно настройкам:
+    локальный файл (DICTIONARY_PATH) с Yandex как запасным вариантом,
+    либо только Yandex, если локальный словарь не настроен.
+    """
+    global _provider
+
+    with _provider_lock:
+        if _provider is None:
+            _provider = _create_provider()
+        return _provider
+
+
+def _create_provider():
+    providers = []
+
+    if config.DICTIONARY_PATH:
+        try:
+            providers.append(LocalDictionaryProvider(config.DICTIONARY_PATH))
+            logger.info(f"📘 Локальный словарь: {config.DICTIONARY_PATH}")
+        except FileNotFoundError as e:
+            logger.warning(f"{e}, используем только Yandex")
+
+    if config.YA_DICTIONARY_API_KEY and (
+        not providers or config.DICTIONARY_YANDEX_FALLBACK
+    ):
+        providers.append(YandexDictionaryProvider())
+
+    if len(providers) == 1:
+        return providers[0]
+    if not providers:
+        # Без ключа Yandex вернёт None и запишет предупреждение в лог
+        return YandexDictionaryProvider()
+    return FallbackDictionaryProvider(providers)
+
+
+def get_phrase_examples(english_phrase):
+    """
+    Получает примеры использования для фразы.
+    Возвращает форматированную строку или сообщение об ошибке.
+    """
+    if not english_phrase or not isinstance(english_phrase, str):
+        return "❌ Неверный формат фразы"
+
+    english_phrase = english_phrase.strip()
+    if not english_phrase:
+        return "❌ Пустая фраза"
+
+    logger.info(f"Поиск примеров для фразы: '{english_phrase}'")
+
+    # Извлекаем первое значимое слово из фразы
+    words = english_phrase.split()
+    if not words:
+        return "❌ Не удалось извлечь слова из фразы"
+
+    # Ищем первое существительное/глагол/прилагательное
+    search_word = words[0]
+    for word in words:
+        word_clean = word.strip(",.!?;:\"'")
+        if len(word_clean) > 2:  # Пропускаем артикли, предлоги
+            search_word = word_clean
+            break
+
+    logger.info(f"Ищем слово для примера: '{search_word}'")
+
+    try:
+        result = get_dictionary_provider().lookup(search_word)
+
+        if not result:
+            return f"❌ Информация для слова '{search_word}' не найдена"
+
+        # Форматируем результат
+        response_parts = []
+
+        if result.get("definitions"):
+            response_parts.append("📖 *Определения:*")
+            for i, definition in enumerate(result["definitions"][:3], 1):
+                response_parts.append(f"{i}. {definition}")
+
+        if result.get("examples"):
+            response_parts.append("\n💡 *Примеры использования:*")
+            for i, example in enumerate(result["examples"], 1):
+                response_parts.append(f"{i}. {example['english']}")
+                response_parts.append(f"   → {example['russian']}")
+
+        if result.get("transcriptions"):
+            response_parts.append(
+                f"\n🔊 *Транскрипция:* `{result['transcriptions'][0]}`"
+            )
+
+        if result.get("parts_of_speech"):
+            response_parts.append(
+                f"\n🏷️ *Часть речи:* {', '.join(result['parts_of_speech'])}"
+            )
+
+        if not response_parts:
+            return f"❌ Для слова '{search_word}' не найдено полезной информации"
+
+        return "\n".join(response_parts)
+
+    except Exception as e:
+        logger.error(f"Неожиданная ошибка при поиске примеров: {e}")
+        return f"❌ Ошибка при получении информации. Попробуйте позже."
+
+
+def build_local_dictionary(dump_path, db_path):
+    """
+    Собирает SQLite-словарь из дампа ответов Yandex Dictionary API
+    (по одному JSON-ответу lookup на строку).
+    Возвращает количество записанных слов.
+    """
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS entries (
+            word TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        ) WITHOUT ROWID
+        """
+    )
+
+    words_saved = 0
+    errors = 0
+
+    try:
+        with open(dump_path, "r", encoding="utf-8") as file:
+            for line_num, line in enumerate(file, 1):
+                line = line.strip()
+                if not line:
+                    continue
+
+                try:
+                    data = json.loads(line)
+                    word = data["def"][0]["text"].lower().strip()
+                except (ValueError, KeyError, IndexError) as e:
+                    errors += 1
+                    if errors <= 2:
+                        print(f"❌ Ошибка в строке {line_num}: {e}")
+                    continue
+
+                result = parse_dictionary_response(data, word)
+                if not result:
+                    continue
+
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (word, data) VALUES (?, ?)",
+                    (word, json.dumps(result, ensure_ascii=False)),
+                )
+                words_saved += 1
+
+        conn.commit()
+    finally:
+        conn.close()
+
+    print(f"📘 Словарь {db_path}: {words_saved} слов, ошибок: {errors}")
+    return words_saved
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Использование: python dictionary.py <дамп.jsonl> <словарь.sqlite>")
+        sys.exit(1)
+
+    build_local_dictionary(sys.argv[1], sys.argv[2])
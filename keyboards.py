@@ -0,0 +1,69 @@
+import json
+
+from telebot import types
+
+
+class RenderedMarkup(types.JsonSerializable):
+    """Клавиатура, уже сериализованная в JSON для Bot API."""
+
+    __slots__ = ("json",)
+
+    def __init__(self, json_text):
+        self.json = json_text
+
+    def to_json(self):
+        return self.json
+
+
+def _button(text):
+    return '{"text": ' + json.dumps(text) + "}"
+
+
+def _rows(texts, row_width):
+    return [
+        "[" + ", ".join(_button(text) for text in texts[start:start + row_width]) + "]"
+        for start in range(0, len(texts), row_width)
+    ]
+
+
+class LearningKeyboard:
+    """
+    Клавиатура карточки: варианты ответа по row_width в ряд,
+    под ними неизменные ряды команд.
+
+    Ряды команд сериализуются один раз при создании, а для каждой карточки
+    в JSON превращаются только тексты ответов - без объектов KeyboardButton
+    и ReplyKeyboardMarkup. Результат совпадает с тем, что собрал бы
+    ReplyKeyboardMarkup(row_width, resize_keyboard=True).add(...) из тех же кнопок,
+    если число ответов кратно row_width.
+    """
+
+    def __init__(self, commands, row_width=2):
+        self.row_width = row_width
+        self._commands = ", ".join(_rows(list(commands), row_width))
+
+    def render(self, answers):
+        """Клавиатура с ответами answers (в переданном порядке)."""
+        rows = _rows(answers, self.row_width)
+        rows.append(self._commands)
+        return RenderedMarkup(
+            '{"keyboard": [' + ", ".join(rows) + '], "resize_keyboard": true}'
+        )
+
+
+def test_learning_keyboard():
+    """Разметка совпадает с ReplyKeyboardMarkup из тех же кнопок."""
+    commands = ["Дальше ⏭", "Добавить фразу ➕", "Удалить фразу 🔙", "Статистика 📊", "Примеры 💡"]
+    answers = ['say "hi"', "good\\bye", "привет", "see you"]
+
+    markup = types.ReplyKeyboardMarkup(row_width=2, resize_keyboard=True)
+    markup.add(*[types.KeyboardButton(text) for text in answers + commands])
+
+    rendered = LearningKeyboard(commands).render(answers)
+    assert rendered.to_json() == markup.to_json(), rendered.to_json()
+    assert json.loads(rendered.to_json())["keyboard"][-1] == [{"text": "Примеры 💡"}]
+    print("✅ Клавиатура карточки собирается правильно")
+
+
+if __name__ == "__main__":
+    test_learning_keyboard()
@@ -1,30 +1,50 @@
-import atexit
-import random
 import time
-import logging
 
-from telebot import TeleBot, custom_filters, types
+# Отсчёт профиля запуска: от импорта main до первого обновления
+STARTUP_STARTED = time.perf_counter()
+
+import io  # noqa: E402
+import random  # noqa: E402
+import threading  # noqa: E402
+import logging  # noqa: E402
+
+from telebot import TeleBot, apihelper, custom_filters, types
 from telebot.handler_backends import State, StatesGroup
 from telebot.storage import StateMemoryStorage
 
 import config
+from admission import AdmissionController
+from bounded_executor import BoundedExecutor
+from keyboards import LearningKeyboard
+from metrics import Gauge, Histogram, start_metrics_server, timed
 from database import (
     add_custom_phrase,
+    close_pool,
+    add_custom_phrases_bulk,
     add_user,
     debug_user_progress,
     delete_user_phrase,
-    get_learned_phrases_count,
+    get_admin_stats,
+    get_catalog_decks,
     get_random_phrase_for_user,
-    get_user_phrase_count,
-    get_user_phrases_list,
+    get_random_phrases_for_user,
+    get_study_settings,
+    get_user_phrases_page,
+    get_user_stats,
     get_wrong_phrases,
     init_db,
     load_initial_phrases,
+    set_study_deck,
+    subscribe,
     update_user_progress,
 )
+from query_budget import query_budget
+from ratelimit import rate_limited
+from tracing import pause, span, traced
 from reminders import ReminderSystem
-from yandex_api import get_phrase_examples
-from database import get_last_phrase_id, mark_phrase_shown
+from shutdown import ShutdownManager
+from study_queue import StudyQueue
+from database import mark_phrase_shown
 
 # Настройка логирования
 logging.basicConfig(
@@ -37,11 +57,115 @@ print("🚀 Запуск EnglishCard Bot...")
 
 # Инициализация бота
 state_storage = StateMemoryStorage()
-bot = TeleBot(config.BOT_TOKEN, state_storage=state_storage)
+# Обработчики вызываются из потоков AdmissionController, а не из пула telebot
+bot = TeleBot(config.BOT_TOKEN, state_storage=state_storage, threaded=False)
+
+# Ограниченная очередь входящих обновлений с отбрасыванием устаревших
+admission = AdmissionController(
+    workers=config.ADMISSION_WORKERS,
+    max_queue=config.ADMISSION_QUEUE_SIZE,
+    per_user_limit=config.ADMISSION_PER_USER_LIMIT,
+    max_update_age=config.MAX_UPDATE_AGE_SECONDS,
+    max_queue_wait=config.MAX_QUEUE_WAIT_SECONDS,
+)
+admission.install(bot)
 
 # Инициализация системы напоминаний
 reminder_system = ReminderSystem(bot)
 
+# Отдельный пул для запросов к словарю, чтобы медленный API
+# не занимал потоки обработки обновлений
+examples_executor = BoundedExecutor(
+    max_workers=config.EXAMPLES_WORKERS,
+    max_queue=config.EXAMPLES_QUEUE_SIZE,
+    name="examples",
+)
+
+# Фоновое пополнение очередей следующих карточек (см. study_queue.py)
+study_executor = BoundedExecutor(
+    max_workers=config.STUDY_QUEUE_WORKERS,
+    max_queue=config.STUDY_QUEUE_BACKLOG,
+    name="study-queue",
+)
+
+# Остановка по SIGTERM/SIGINT: перестаём принимать обновления,
+# дорабатываем начатые и только потом закрываем соединения
+shutdown_manager = ShutdownManager(timeout=config.SHUTDOWN_TIMEOUT)
+shutdown_manager.on_request(admission.close)
+shutdown_manager.on_request(bot.stop_polling)
+
+
+def confirm_processed_updates():
+    """
+    Подтверждает Telegram полученные обновления, чтобы следующий экземпляр
+    бота не обработал их повторно. Если очередь не успела разобраться,
+    не подтверждаем: повтор лучше потерянного ответа.
+    """
+    if admission.drained and bot.last_update_id:
+        # telebot не передаёт нулевой long polling, 1 секунда - минимум
+        bot.get_updates(
+            offset=bot.last_update_id + 1, limit=1, timeout=5, long_polling_timeout=1
+        )
+
+
+shutdown_manager.add_step("Очередь обновлений", admission.stop)
+shutdown_manager.add_step("Подтверждение обновлений", confirm_processed_updates)
+shutdown_manager.add_step("Поиск примеров", examples_executor.drain)
+shutdown_manager.add_step("Очередь карточек", study_executor.drain)
+shutdown_manager.add_step("Напоминания", reminder_system.shutdown)
+shutdown_manager.add_step("Соединения с БД", close_pool)
+
+# Профиль запуска: этапы в секундах от импорта main
+startup_seconds = Gauge(
+    "bot_startup_seconds", "Этапы запуска бота от импорта main", labels=("stage",)
+)
+
+
+def mark_startup(stage):
+    """Фиксирует завершение этапа запуска в логе и в метриках."""
+    elapsed = time.perf_counter() - STARTUP_STARTED
+    startup_seconds.set(round(elapsed, 3), stage=stage)
+    logger.info(f"⏱️ Запуск: {stage} через {elapsed:.2f} с")
+
+
+# Время до первого обновления - главный показатель скорости запуска
+admission.on_first_update = lambda: mark_startup("first_update")
+
+# Метрики горячего пути: обработчики, запросы к Telegram и очереди
+handler_seconds = Histogram(
+    "bot_handler_seconds", "Длительность обработчиков бота", labels=("handler",)
+)
+telegram_request_seconds = Histogram(
+    "bot_telegram_request_seconds",
+    "Длительность запросов к Telegram Bot API",
+    labels=("method",),
+)
+Gauge("bot_examples_pending", "Запросы примеров в очереди и в работе").set_function(
+    lambda: examples_executor.pending
+)
+
+
+def send_telegram_request(method, url, **kwargs):
+    """Отправляет запрос к Bot API через сессию telebot и замеряет его время."""
+    api_method = url.rsplit("/", 1)[-1]
+    with telegram_request_seconds.time(method=api_method), span(
+        f"telegram.{api_method}"
+    ):
+        return apihelper._get_req_session().request(method, url, **kwargs)
+
+
+apihelper.CUSTOM_REQUEST_SENDER = send_telegram_request
+
+# Ограничения массового добавления фраз (/bulk)
+MAX_BULK_PHRASES = 1000
+MAX_BULK_FILE_SIZE = 1024 * 1024
+
+# Сколько фраз показывать на одной странице списка удаления
+DELETE_PAGE_SIZE = 20
+
+# Колода личных фраз пользователя (category у фраз, добавленных пользователями)
+CUSTOM_DECK = "custom"
+
 # Администраторы бота
 ADMIN_USERNAMES = ["@MrGrigorev0ne"]
 ADMIN_IDS = []
@@ -55,10 +179,17 @@ class Command:
     EXAMPLES = "Примеры 💡"
 
 
+# Устаревшие нажатия кнопок отбрасываются так же, как команды
+admission.command_texts = frozenset(
+    value for name, value in vars(Command).items() if not name.startswith("_")
+)
+
+
 class MyStates(StatesGroup):
     target_phrase = State()
     translate_phrase = State()
     add_new_phrase = State()
+    bulk_add = State()
 
 
 def is_admin(user_id, username):
@@ -69,28 +200,28 @@ def is_admin(user_id, username):
     return user_id in ADMIN_IDS
 
 
+# Ряды команд под вариантами ответа сериализуются один раз (см. keyboards.py)
+learning_keyboard = LearningKeyboard(
+    [
+        Command.NEXT,
+        Command.ADD_PHRASE,
+        Command.DELETE_PHRASE,
+        Command.STATS,
+        Command.EXAMPLES,
+    ]
+)
+
+
 def create_learning_keyboard(phrases, target_russian):
     """Создает клавиатуру для изучения фраз с кнопкой примеров"""
-    markup = types.ReplyKeyboardMarkup(row_width=2, resize_keyboard=True)
-
-    buttons = [types.KeyboardButton(phrase["english_phrase"]) for phrase in phrases]
-    random.shuffle(buttons)
-
-    buttons.extend(
-        [
-            types.KeyboardButton(Command.NEXT),
-            types.KeyboardButton(Command.ADD_PHRASE),
-            types.KeyboardButton(Command.DELETE_PHRASE),
-            types.KeyboardButton(Command.STATS),
-            types.KeyboardButton(Command.EXAMPLES),
-        ]
-    )
+    answers = [phrase["english_phrase"] for phrase in phrases]
+    random.shuffle(answers)
 
-    markup.add(*buttons)
     greeting = f'🇷🇺 Выбери перевод:\n"{target_russian}"'
-    return greeting, markup
+    return greeting, learning_keyboard.render(answers)
 
 
+@traced()
 def ensure_unique_answers(answers, target_phrase_id, target_text, user_id):
     """
     Гарантирует наличие 4 уникальных вариантов ответа.
@@ -146,6 +277,7 @@ def ensure_unique_answers(answers, target_phrase_id, target_text, user_id):
 
 
 @bot.message_handler(commands=["start", "phrases"])
+@query_budget(max_queries=9, max_connections=6)
 def start_bot(message):
     """Обработчик команды /start."""
     user = message.from_user
@@ -158,6 +290,9 @@ def start_bot(message):
         "/start — Начать\n"
         "/phrases — Новая фраза\n"
         "/stats — Статистика\n"
+        "/bulk — Добавить много фраз сразу\n"
+        "/deck — Выбрать колоду\n"
+        "/level — Выбрать уровень\n"
         "/examples — Примеры использования\n\n"
         "*Готовы начать?* Жмите «Дальше ⏭»!"
     )
@@ -166,41 +301,10 @@ def start_bot(message):
     show_next_phrase(message)
 
 
-def show_next_phrase(message):
-    """Показывает следующую фразу для изучения без повторов подряд."""
-    user_id = message.from_user.id
-    cid = message.chat.id
-
-    # последняя показанная фраза берётся из БД (работает даже после перезапуска бота)
-    last_id = get_last_phrase_id(user_id)
-
-    phrase = None
-    for _ in range(5):  # до 5 попыток не повторять подряд
-        candidate = get_random_phrase_for_user(user_id)
-        if not candidate:
-            break
-        if candidate["phrase_id"] != last_id:
-            phrase = candidate
-            break
-
-    if not phrase:
-        phrase = get_random_phrase_for_user(user_id)
-
-    if not phrase:
-        markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
-        markup.add(types.KeyboardButton(Command.ADD_PHRASE))
-        bot.send_message(
-            cid,
-            "У вас нет фраз для изучения. Добавьте первую фразу.",
-            reply_markup=markup,
-        )
-        return
-
-    # фиксируем, что фраза была показана (важно для новых пользователей)
-    mark_phrase_shown(user_id, phrase["phrase_id"])
-
+def make_card(user_id, phrase, deck):
+    """Карточка фразы: варианты ответа и готовая клавиатура."""
     # неправильные варианты
-    wrong_phrases = get_wrong_phrases(phrase["phrase_id"], user_id, 6)
+    wrong_phrases = get_wrong_phrases(phrase["phrase_id"], user_id, 6, **deck)
     all_answers = [phrase] + wrong_phrases
 
     final_answers = ensure_unique_answers(
@@ -214,7 +318,50 @@ def show_next_phrase(message):
         final_answers,
         phrase["russian_translation"],
     )
-    bot.send_message(cid, greeting, reply_markup=markup)
+    return {"phrase": phrase, "greeting": greeting, "markup": markup}
+
+
+def build_study_cards(user_id, deck, count, exclude_phrase_ids):
+    """Следующие карточки пользователя для очереди (выполняется в study_executor)."""
+    phrases = get_random_phrases_for_user(user_id, count, exclude_phrase_ids, **deck)
+    return [make_card(user_id, phrase, deck) for phrase in phrases]
+
+
+# Очередь следующих карточек: «Дальше» снимает готовую карточку,
+# а новые считаются в фоне
+study_queue = StudyQueue(
+    build_study_cards,
+    study_executor,
+    size=config.STUDY_QUEUE_SIZE,
+    low_water=config.STUDY_QUEUE_LOW_WATER,
+    max_users=config.STUDY_QUEUE_MAX_USERS,
+    ttl=config.STUDY_QUEUE_TTL_SECONDS,
+)
+subscribe("user_phrases_changed", study_queue.invalidate)
+subscribe("phrases_deleted", study_queue.discard_phrases)
+
+
+@timed(handler_seconds)
+@query_budget(max_queries=8, max_connections=5)
+def show_next_phrase(message):
+    """Показывает следующую фразу для изучения без повторов подряд."""
+    user_id = message.from_user.id
+    cid = message.chat.id
+
+    card = study_queue.pop(user_id)
+    if card is None:
+        card = compute_next_card(user_id)
+        if card is None:
+            send_no_phrases(cid, get_study_settings(user_id))
+            return
+        study_queue.prime(user_id, card["deck"], card["phrase"]["phrase_id"])
+
+    phrase = card["phrase"]
+
+    # фиксируем, что фраза была показана (важно для новых пользователей)
+    mark_phrase_shown(user_id, phrase["phrase_id"])
+
+    bot.send_message(cid, card["greeting"], reply_markup=card["markup"])
 
     # сохраняем state для проверки ответа
     bot.set_state(user_id, MyStates.target_phrase, cid)
@@ -229,9 +376,45 @@ def show_next_phrase(message):
         )
 
 
+def compute_next_card(user_id):
+    """Считает следующую карточку при показе, когда очередь пользователя пуста."""
+    # последняя показанная фраза и выбранная колода берутся из users
+    # одним запросом (работает даже после перезапуска бота)
+    settings = get_study_settings(user_id)
+    last_id = settings["last_phrase_id"]
+    deck = {"category": settings["category"], "level": settings["level"]}
+
+    # исключаем её прямо в запросе, без повторных попыток
+    phrase = get_random_phrase_for_user(user_id, exclude_phrase_id=last_id, **deck)
+
+    if not phrase and last_id is not None:
+        # осталась единственная неизученная фраза - показываем её снова
+        phrase = get_random_phrase_for_user(user_id, **deck)
+
+    if not phrase:
+        return None
+
+    card = make_card(user_id, phrase, deck)
+    card["deck"] = deck
+    return card
+
+
+def send_no_phrases(cid, settings):
+    """Сообщение, когда изучать нечего (в выбранной колоде или вообще)."""
+    markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    markup.add(types.KeyboardButton(Command.ADD_PHRASE))
+    if settings["category"] is not None or settings["level"] is not None:
+        text = (
+            f"В колоде «{describe_deck(settings['category'], settings['level'])}» "
+            "нет неизученных фраз.\nВыберите другую: /deck, /level"
+        )
+    else:
+        text = "У вас нет фраз для изучения. Добавьте первую фразу."
+    bot.send_message(cid, text, reply_markup=markup)
 
 
 @bot.message_handler(func=lambda message: message.text == Command.NEXT)
+@rate_limited
 def next_phrase(message):
     """Обработчик кнопки 'Дальше ⏭'"""
     show_next_phrase(message)
@@ -256,8 +439,24 @@ def delete_phrase_button(message):
 
 
 @bot.message_handler(func=lambda message: message.text == Command.EXAMPLES)
+@rate_limited
 def show_examples_button(message):
     """Показывает примеры использования текущей фразы"""
+    send_phrase_examples(message)
+
+
+@bot.message_handler(commands=["examples"])
+@rate_limited
+def show_examples_command(message):
+    """Команда для показа примеров использования"""
+    send_phrase_examples(message)
+
+
+def send_phrase_examples(message):
+    """
+    Отправляет заглушку и ставит поиск примеров в отдельный пул.
+    Результат приходит редактированием заглушки, обработчик не ждёт словарь.
+    """
     cid = message.chat.id
     user_id = message.from_user.id
 
@@ -273,41 +472,87 @@ def show_examples_button(message):
             )
             return
 
-    bot.send_message(cid, "🔍 Ищу примеры использования...")
+    placeholder = bot.send_message(cid, "🔍 Ищу примеры использования...")
+
+    future = examples_executor.submit(
+        deliver_phrase_examples, cid, placeholder.message_id, target_phrase
+    )
+    if future is None:
+        bot.edit_message_text(
+            "⏳ Сейчас слишком много запросов примеров. Попробуйте через минуту.",
+            cid,
+            placeholder.message_id,
+        )
 
-    examples_text = get_phrase_examples(target_phrase)
 
-    response = f"📚 *Примеры для фразы:* `{target_phrase}`\n\n{examples_text}"
-    bot.send_message(cid, response, parse_mode="Markdown")
+def deliver_phrase_examples(cid, message_id, target_phrase):
+    """Ищет примеры в фоне и подставляет их вместо заглушки"""
+    from dictionary import get_phrase_examples
 
+    try:
+        examples_text = get_phrase_examples(target_phrase)
+        response = f"📚 *Примеры для фразы:* `{target_phrase}`\n\n{examples_text}"
+        bot.edit_message_text(response, cid, message_id, parse_mode="Markdown")
+    except Exception as e:
+        logger.error(f"Не удалось доставить примеры для '{target_phrase}': {e}")
+        bot.edit_message_text(
+            "❌ Ошибка при получении примеров. Попробуйте позже.", cid, message_id
+        )
 
-@bot.message_handler(commands=["examples"])
-def show_examples_command(message):
-    """Команда для показа примеров использования"""
-    cid = message.chat.id
-    user_id = message.from_user.id
 
-    # Получаем данные из состояния
-    with bot.retrieve_data(user_id, cid) as data:
-        if "current_english_phrase" in data and data["current_english_phrase"]:
-            target_phrase = data["current_english_phrase"]
-        elif "target_phrase" in data and data["target_phrase"]:
-            target_phrase = data["target_phrase"]
-        else:
-            bot.send_message(
-                cid, "❌ Сначала выберите фразу для изучения с помощью /start"
-            )
-            return
+def describe_deck(category=None, level=None):
+    """Название выбранной колоды для сообщений"""
+    deck = "мои фразы" if category == CUSTOM_DECK else category or "все колоды"
+    return f"{deck}, {level or 'все уровни'}"
 
-    bot.send_message(cid, "🔍 Ищу примеры использования...")
 
-    examples_text = get_phrase_examples(target_phrase)
+@bot.message_handler(commands=["deck", "level"])
+@query_budget(max_queries=2, max_connections=2)
+def choose_deck(message):
+    """Выбор колоды (/deck) или уровня (/level) для изучения"""
+    cid = message.chat.id
+    settings = get_study_settings(message.from_user.id)
+    decks = get_catalog_decks()
+
+    markup = types.InlineKeyboardMarkup(row_width=3)
+    if message.text.lstrip("/").startswith("level"):
+        kind = "level"
+        options = sorted({level for _, level, _ in decks if level})
+        buttons = [types.InlineKeyboardButton("Все уровни", callback_data="level_all")]
+        prompt = "🎚️ Выберите уровень"
+    else:
+        kind = "deck"
+        counts = {}
+        for category, _, count in decks:
+            if category and category != CUSTOM_DECK:
+                counts[category] = counts.get(category, 0) + count
+        options = sorted(counts)
+        buttons = [
+            types.InlineKeyboardButton("Все колоды", callback_data="deck_all"),
+            types.InlineKeyboardButton(
+                "Мои фразы", callback_data=f"deck_{CUSTOM_DECK}"
+            ),
+        ]
+        prompt = "📚 Выберите колоду"
 
-    response = f"📚 *Примеры для фразы:* `{target_phrase}`\n\n{examples_text}"
-    bot.send_message(cid, response, parse_mode="Markdown")
+    for option in options:
+        callback_data = f"{kind}_{option}"
+        # Telegram ограничивает callback_data 64 байтами
+        if len(callback_data.encode("utf-8")) <= 64:
+            label = f"{option} ({counts[option]})" if kind == "deck" else option
+            buttons.append(types.InlineKeyboardButton(label, callback_data=callback_data))
+
+    markup.add(*buttons)
+    bot.send_message(
+        cid,
+        f"{prompt}\nСейчас: {describe_deck(settings['category'], settings['level'])}",
+        reply_markup=markup,
+    )
 
 
 @bot.message_handler(func=lambda message: True, state=MyStates.target_phrase)
+@rate_limited
+@query_budget(max_queries=11, max_connections=6)
 def check_answer(message):
     """Проверяет ответ пользователя"""
     cid = message.chat.id
@@ -338,7 +583,8 @@ def check_answer(message):
         )
 
         # Показываем следующий вопрос через 1 секунду
-        time.sleep(1)
+        # (пауза не считается в длительности трассировки)
+        pause(1)
         show_next_phrase(message)
     else:
         # Неправильный ответ
@@ -364,13 +610,16 @@ def check_answer(message):
 
 
 @bot.message_handler(commands=["stats"])
+@rate_limited
+@query_budget(max_queries=1, max_connections=1)
 def show_stats(message):
     """Показывает статистику пользователя"""
     cid = message.chat.id
     user_id = message.from_user.id
 
-    total_phrases = get_user_phrase_count(user_id)
-    learned_phrases = get_learned_phrases_count(user_id)
+    stats = get_user_stats(user_id)
+    total_phrases = stats["total_phrases"]
+    learned_phrases = stats["learned_phrases"]
     progress = int((learned_phrases / total_phrases * 100)) if total_phrases > 0 else 0
 
     stats_text = (
@@ -378,7 +627,9 @@ def show_stats(message):
         f"📚 Всего фраз: {total_phrases}\n"
         f"✅ Изучено: {learned_phrases}\n"
         f"🎯 Прогресс: {progress}%\n"
-        f"📈 Соотношение: {learned_phrases}/{total_phrases}"
+        f"📈 Соотношение: {learned_phrases}/{total_phrases}\n"
+        f"🔥 Дней подряд: {stats['streak_days']}\n"
+        f"📝 Ответов сегодня: {stats['answers_today']}"
     )
 
     bot.send_message(cid, stats_text, parse_mode="Markdown")
@@ -514,15 +765,116 @@ def save_translation(message):
     show_next_phrase(message)
 
 
+@bot.message_handler(commands=["bulk"])
+def bulk_add_command(message):
+    """Начинает массовое добавление фраз (текстом или CSV-файлом)"""
+    cid = message.chat.id
+    user_id = message.from_user.id
+
+    bot.set_state(user_id, MyStates.bulk_add, cid)
+
+    markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    markup.add(types.KeyboardButton("❌ Отмена"))
+
+    bot.send_message(
+        cid,
+        "📥 *Массовое добавление фраз*\n\n"
+        "Отправьте фразы сообщением, по одной на строку:\n"
+        "`english phrase - русский перевод`\n\n"
+        "Или загрузите CSV-файл: первая колонка - английская фраза, "
+        f"вторая - перевод (до {MAX_BULK_PHRASES} фраз).\n\n"
+        "Или нажмите '❌ Отмена' для отмены операции",
+        reply_markup=markup,
+        parse_mode="Markdown",
+    )
+
+
+@bot.message_handler(state=MyStates.bulk_add, content_types=["text", "document"])
+def save_bulk_phrases(message):
+    """Разбирает присланный текст или файл и добавляет фразы одной транзакцией"""
+    from bulk_import import iter_csv_phrases, iter_text_phrases
+
+    cid = message.chat.id
+    user_id = message.from_user.id
+
+    if message.content_type == "text":
+        user_input = message.text.strip()
+        if user_input == "❌ Отмена" or user_input.lower() in [
+            "отмена",
+            "cancel",
+            "отменить",
+        ]:
+            bot.delete_state(user_id, cid)
+            bot.send_message(
+                cid,
+                "❌ Добавление фраз отменено.",
+                reply_markup=types.ReplyKeyboardRemove(),
+            )
+            show_next_phrase(message)
+            return
+
+        parsed = iter_text_phrases(user_input.splitlines())
+    else:
+        document = message.document
+        if document.file_size and document.file_size > MAX_BULK_FILE_SIZE:
+            bot.send_message(cid, "❌ Файл слишком большой (максимум 1 МБ).")
+            return
+
+        file_info = bot.get_file(document.file_id)
+        content = bot.download_file(file_info.file_path)
+        lines = io.TextIOWrapper(io.BytesIO(content), encoding="utf-8-sig", errors="replace")
+
+        file_name = (document.file_name or "").lower()
+        parsed = iter_csv_phrases(lines) if file_name.endswith(".csv") else iter_text_phrases(lines)
+
+    phrases = []
+    skipped = 0
+    for pair in parsed:
+        if pair is None:
+            skipped += 1
+            continue
+        phrases.append(pair)
+        if len(phrases) >= MAX_BULK_PHRASES:
+            break
+
+    if not phrases:
+        bot.send_message(
+            cid,
+            "❌ Не удалось найти ни одной фразы. Формат строки: "
+            "`english phrase - русский перевод`",
+            parse_mode="Markdown",
+        )
+        return
+
+    try:
+        added = add_custom_phrases_bulk(user_id, phrases)
+    except Exception as e:
+        logger.error(f"Ошибка массового добавления фраз пользователя {user_id}: {e}")
+        bot.send_message(cid, "❌ Не удалось добавить фразы. Попробуйте позже.")
+        return
+
+    bot.send_message(
+        cid,
+        f"✅ *Импорт завершён!*\n\n"
+        f"📥 Распознано фраз: {len(phrases)}\n"
+        f"➕ Добавлено в ваш набор: {added}\n"
+        f"⚠️ Пропущено строк: {skipped}",
+        reply_markup=types.ReplyKeyboardRemove(),
+        parse_mode="Markdown",
+    )
+
+    bot.delete_state(user_id, cid)
+    show_next_phrase(message)
+
+
 def delete_phrase(message):
     """Показывает список фраз пользователя для удаления"""
     cid = message.chat.id
     user_id = message.from_user.id
 
-    # Получаем список фраз пользователя
-    user_phrases = get_user_phrases_list(user_id)
+    page = build_delete_page(user_id)
 
-    if not user_phrases:
+    if not page:
         bot.send_message(
             cid,
             "❌ У вас нет фраз для удаления. Добавьте фразы с помощью кнопки 'Добавить фразу ➕'",
@@ -530,13 +882,38 @@ def delete_phrase(message):
         )
         return
 
-    # Создаем inline-клавиатуру с фразами
-    markup = types.InlineKeyboardMarkup(row_width=1)
+    phrases_text, markup = page
+    bot.send_message(
+        cid,
+        phrases_text,
+        reply_markup=markup,
+        parse_mode="Markdown",
+    )
 
-    # Ограничиваем количество фраз для отображения (чтобы не было слишком длинного списка)
-    display_phrases = user_phrases[:20]  # Показываем первые 20 фраз
 
-    for phrase in display_phrases:
+def build_delete_page(user_id, after_phrase_id=None, before_phrase_id=None):
+    """
+    Собирает страницу списка фраз для удаления с кнопками «назад/вперёд».
+    Возвращает (текст, клавиатура) или None, если фраз нет.
+    """
+    page = get_user_phrases_page(
+        user_id,
+        limit=DELETE_PAGE_SIZE,
+        after_phrase_id=after_phrase_id,
+        before_phrase_id=before_phrase_id,
+    )
+    user_phrases = page["phrases"]
+
+    if not user_phrases:
+        # Фраза-курсор могла быть удалена - начинаем с первой страницы
+        if after_phrase_id is not None or before_phrase_id is not None:
+            return build_delete_page(user_id)
+        return None
+
+    # Создаем inline-клавиатуру с фразами
+    markup = types.InlineKeyboardMarkup(row_width=2)
+
+    for phrase in user_phrases:
         phrase_text = phrase["english_phrase"]
         # Обрезаем длинные фразы для кнопки
         button_text = phrase_text[:40] + "..." if len(phrase_text) > 40 else phrase_text
@@ -544,22 +921,33 @@ def delete_phrase(message):
         button_text = f"{status_icon} {button_text}"
 
         callback_data = f"delete_phrase_{phrase['phrase_id']}"
-        markup.add(types.InlineKeyboardButton(button_text, callback_data=callback_data))
+        markup.row(types.InlineKeyboardButton(button_text, callback_data=callback_data))
+
+    # Кнопки перехода между страницами
+    nav_buttons = []
+    if page["has_prev"]:
+        nav_buttons.append(
+            types.InlineKeyboardButton(
+                "⬅️ Назад",
+                callback_data=f"delete_page_prev_{user_phrases[0]['phrase_id']}",
+            )
+        )
+    if page["has_next"]:
+        nav_buttons.append(
+            types.InlineKeyboardButton(
+                "Вперёд ➡️",
+                callback_data=f"delete_page_next_{user_phrases[-1]['phrase_id']}",
+            )
+        )
+    if nav_buttons:
+        markup.row(*nav_buttons)
 
     # Добавляем кнопку отмены
     cancel_btn = types.InlineKeyboardButton("❌ Отмена", callback_data="cancel_delete")
-    markup.add(cancel_btn)
+    markup.row(cancel_btn)
 
-    phrases_text = "🗑️ *Выберите фразу для удаления:*\n\n"
-    if len(user_phrases) > 20:
-        phrases_text += f"*Показано первых 20 из {len(user_phrases)} фраз*\n\n"
-
-    bot.send_message(
-        cid,
-        phrases_text,
-        reply_markup=markup,
-        parse_mode="Markdown",
-    )
+    phrases_text = "🗑️ *Выберите фразу для удаления:*"
+    return phrases_text, markup
 
 
 @bot.message_handler(commands=["debug"])
@@ -740,49 +1128,23 @@ def show_users_stats(message):
         bot.send_message(cid, "❌ Эта команда доступна только администраторам")
         return
 
-    from database import get_connection
-
-    conn = get_connection()
-    cur = conn.cursor()
-
     try:
-        # Общее количество пользователей
-        cur.execute("SELECT COUNT(*) FROM users")
-        total_users = cur.fetchone()[0]
-
-        # Количество активных пользователей (с фразами)
-        cur.execute(
-            """
-            SELECT COUNT(DISTINCT user_id) 
-            FROM user_phrases 
-            WHERE correct_answers > 0
-        """
-        )
-        active_users = cur.fetchone()[0]
-
-        # Общее количество фраз
-        cur.execute("SELECT COUNT(*) FROM phrases")
-        total_phrases = cur.fetchone()[0]
-
-        # Количество пользовательских фраз
-        cur.execute("SELECT COUNT(*) FROM user_phrases")
-        user_phrases_count = cur.fetchone()[0]
+        # Снимок обновляется по расписанию, здесь только одно чтение
+        stats = get_admin_stats()
 
         stats_text = (
             f"📈 *Статистика бота:*\n\n"
-            f"👥 Всего пользователей: {total_users}\n"
-            f"🎯 Активных пользователей: {active_users}\n"
-            f"📚 Всего фраз в базе: {total_phrases}\n"
-            f"💾 Пользовательских связей: {user_phrases_count}"
+            f"👥 Всего пользователей: {stats['total_users']}\n"
+            f"🎯 Активных пользователей: {stats['active_users']}\n"
+            f"📚 Всего фраз в базе: ≈{stats['total_phrases']}\n"
+            f"💾 Пользовательских связей: ≈{stats['user_phrases']}\n\n"
+            f"🕒 Обновлено: {stats['refreshed_at'].strftime('%d.%m.%Y %H:%M')}"
         )
 
         bot.send_message(cid, stats_text, parse_mode="Markdown")
 
     except Exception as e:
         bot.send_message(cid, f"❌ Ошибка при получении статистики: {e}")
-    finally:
-        cur.close()
-        conn.close()
 
 
 @bot.callback_query_handler(func=lambda call: True)
@@ -810,7 +1172,13 @@ def handle_callback(call):
 
     elif call.data == "reminder_status":
         # Показываем статус напоминаний
-        jobs = reminder_system.scheduler.get_jobs()
+        scheduler = reminder_system.scheduler
+        if scheduler is None or not scheduler.running:
+            # Планировщик запускается в deferred_init и мог ещё не стартовать
+            bot.answer_callback_query(call.id, "⏳ Напоминания ещё не запущены")
+            return
+
+        jobs = scheduler.get_jobs()
         status_text = "📊 *Статус напоминаний:*\n\n"
 
         for job in jobs:
@@ -834,29 +1202,37 @@ def handle_callback(call):
         bot.answer_callback_query(call.id)
         show_users_stats(call.message)
 
+    elif call.data.startswith(("deck_", "level_")):
+        # Выбор колоды или уровня: второй фильтр остаётся прежним
+        kind, value = call.data.split("_", 1)
+        value = None if value == "all" else value
+
+        settings = get_study_settings(user_id)
+        category = value if kind == "deck" else settings["category"]
+        level = value if kind == "level" else settings["level"]
+        set_study_deck(user_id, category, level)
+
+        bot.answer_callback_query(call.id, "✅ Сохранено")
+        bot.edit_message_text(
+            f"✅ Изучаем: {describe_deck(category, level)}\nНажмите «{Command.NEXT}»",
+            cid,
+            call.message.message_id,
+        )
+
     elif call.data.startswith("delete_phrase_"):
         # Обработка удаления фразы
         try:
             phrase_id = int(call.data.split("_")[2])
 
-            # Получаем информацию о фразе перед удалением
-            user_phrases = get_user_phrases_list(user_id, limit=1000)
-            phrase_info = next(
-                (p for p in user_phrases if p["phrase_id"] == phrase_id), None
-            )
-
-            if phrase_info:
-                english_phrase = phrase_info["english_phrase"]
-                russian_translation = phrase_info["russian_translation"]
-
-                # Удаляем фразу
-                delete_user_phrase(user_id, phrase_id)
+            # Удаляем фразу и сразу получаем её текст
+            deleted = delete_user_phrase(user_id, phrase_id)
 
+            if deleted:
                 bot.answer_callback_query(call.id, "✅ Фраза удалена")
                 bot.edit_message_text(
                     f"🗑️ *Фраза удалена из вашего набора:*\n\n"
-                    f"🇬🇧 `{english_phrase}`\n"
-                    f"🇷🇺 `{russian_translation}`",
+                    f"🇬🇧 `{deleted['english_phrase']}`\n"
+                    f"🇷🇺 `{deleted['russian_translation']}`",
                     cid,
                     call.message.message_id,
                     parse_mode="Markdown",
@@ -867,6 +1243,34 @@ def handle_callback(call):
             bot.answer_callback_query(call.id, "❌ Ошибка при удалении")
             print(f"Ошибка при удалении фразы: {e}")
 
+    elif call.data.startswith("delete_page_"):
+        # Переход между страницами списка удаления
+        try:
+            _, _, direction, phrase_id = call.data.split("_")
+            phrase_id = int(phrase_id)
+        except ValueError:
+            bot.answer_callback_query(call.id, "❌ Ошибка")
+            return
+
+        if direction == "next":
+            page = build_delete_page(user_id, after_phrase_id=phrase_id)
+        else:
+            page = build_delete_page(user_id, before_phrase_id=phrase_id)
+
+        bot.answer_callback_query(call.id)
+        if not page:
+            bot.edit_message_text("❌ У вас нет фраз для удаления", cid, call.message.message_id)
+            return
+
+        phrases_text, markup = page
+        bot.edit_message_text(
+            phrases_text,
+            cid,
+            call.message.message_id,
+            reply_markup=markup,
+            parse_mode="Markdown",
+        )
+
     elif call.data == "cancel_delete":
         # Отмена удаления
         bot.answer_callback_query(call.id, "Отменено")
@@ -879,30 +1283,87 @@ def handle_callback(call):
 
 def initialize_bot():
     """
-    Инициализирует бота - создает БД, загружает данные и запускает напоминания
+    Готовит то, без чего бот не может отвечать: конфигурацию, схему БД
+    и очередь обновлений. Остальное запускается в фоне (deferred_init).
     """
+    config.validate_config()
+
     print("🔄 Инициализация базы данных...")
     init_db()
+    mark_startup("init_db")
 
-    print("📥 Загрузка начальных фраз...")
-    load_initial_phrases()
+    print("🚦 Запуск очереди обновлений...")
+    admission.start()
 
-    print("⏰ Запуск системы напоминаний...")
-    reminder_system.start()
+    if config.METRICS_PORT:
+        try:
+            start_metrics_server(config.METRICS_PORT)
+        except OSError as e:
+            # Порт может быть ещё занят предыдущим экземпляром при перезапуске
+            logger.error(f"❌ Метрики недоступны на порту {config.METRICS_PORT}: {e}")
 
     print(f"👑 Администраторы: {ADMIN_USERNAMES}")
 
-    # Регистрируем функцию остановки при завершении работы
-    atexit.register(reminder_system.shutdown)
+    shutdown_manager.install_signal_handlers()
+
+    threading.Thread(target=deferred_init, name="deferred-init", daemon=True).start()
 
     print("✅ Бот готов к работе!")
     print("🤖 Запуск бота...")
 
 
+def deferred_init():
+    """
+    Некритичная инициализация, которая идёт параллельно с обработкой
+    обновлений: импорт фраз из CSV, планировщик, словарь и индекс похожих фраз.
+    """
+    print("📥 Загрузка начальных фраз...")
+    try:
+        load_initial_phrases()
+    except Exception as e:
+        logger.error(f"Не удалось загрузить начальные фразы: {e}")
+
+    if shutdown_manager.requested:
+        return
+
+    print("⏰ Запуск системы напоминаний...")
+    reminder_system.start()
+
+    try:
+        from dictionary import get_dictionary_provider
+
+        get_dictionary_provider()
+    except Exception as e:
+        logger.error(f"Не удалось подготовить словарь: {e}")
+
+    # До готовности индекса варианты ответа выбираются случайно в SQL
+    try:
+        from similarity import start_similarity_index
+
+        start_similarity_index()
+    except Exception as e:
+        logger.error(f"Не удалось построить индекс похожих фраз: {e}")
+
+    mark_startup("deferred_init")
+
+
 # Добавляем кастомные фильтры для работы с состояниями
 bot.add_custom_filter(custom_filters.StateFilter(bot))
 
+# Замеряем длительность всех зарегистрированных обработчиков
+for handler in bot.message_handlers + bot.callback_query_handlers:
+    handler["function"] = timed(handler_seconds)(handler["function"])
+
 # Инициализация и запуск
 if __name__ == "__main__":
+    mark_startup("imports")
     initialize_bot()
-    bot.infinity_polling(skip_pending=True)
+    mark_startup("polling")
+    # Старые обновления не пропускаем: их отбросит AdmissionController по возрасту,
+    # а свежие, не подтверждённые прошлым экземпляром, будут обработаны
+    try:
+        # Сигнал мог прийти ещё при запуске - тогда polling не начинаем
+        if not shutdown_manager.requested:
+            bot.infinity_polling(long_polling_timeout=config.POLLING_TIMEOUT)
+    finally:
+        shutdown_manager.run()
@@ -0,0 +1,228 @@
+import bisect
+import contextlib
+import functools
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import tracing
+
+# Простые метрики процесса в текстовом формате Prometheus.
+# Без внешних зависимостей: счётчики, показатели и гистограммы
+# хранятся в памяти процесса и отдаются по HTTP (start_metrics_server).
+
+logger = logging.getLogger(__name__)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _format_labels(label_names, label_values):
+    if not label_names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{value}"' for name, value in zip(label_names, label_values)
+    )
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    metric_type = "untyped"
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def samples(self):
+        """Возвращает список (имя, метки, значение) для вывода."""
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            (self.name, _format_labels(self.label_names, key), value)
+            for key, value in sorted(items)
+        ]
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Counter(_Metric):
+    """Монотонно растущий счётчик."""
+
+    metric_type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Текущее значение: задаётся вручную или функцией при каждом чтении."""
+
+    metric_type = "gauge"
+
+    def __init__(self, name, description, labels=()):
+        super().__init__(name, description, labels)
+        self._function = None
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function):
+        """Значение берётся из function() в момент чтения метрик."""
+        self._function = function
+
+    def samples(self):
+        if self._function is not None:
+            return [(self.name, "", self._function())]
+        return super().samples()
+
+
+class Histogram(_Metric):
+    """Распределение длительностей (в секундах) по корзинам."""
+
+    metric_type = "histogram"
+
+    DEFAULT_BUCKETS = (
+        0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+    )
+
+    def __init__(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # счётчики корзин (последняя - +Inf), сумма, количество
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def value(self, **labels):
+        """Количество наблюдений с такими метками."""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[2] if state else 0
+
+    def samples(self):
+        with self._lock:
+            items = [
+                (key, list(counts), total, count)
+                for key, (counts, total, count) in self._values.items()
+            ]
+
+        samples = []
+        for key, counts, total, count in sorted(items):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.label_names + ("le",), key + (bound,))
+                samples.append((f"{self.name}_bucket", labels, cumulative))
+
+            labels = _format_labels(self.label_names, key)
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+def timed(histogram, **labels):
+    """
+    Декоратор: записывает длительность вызова в гистограмму
+    и спан в текущую трассировку.
+    Без явных меток единственная метка гистограммы получает имя функции.
+    """
+
+    def decorator(func):
+        observed_labels = labels or {histogram.label_names[0]: func.__name__}
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                with tracing.span(func.__name__):
+                    return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started, **observed_labels)
+
+        return wrapper
+
+    return decorator
+
+
+def render():
+    """Все зарегистрированные метрики в текстовом формате Prometheus."""
+    with _registry_lock:
+        metrics = list(_registry)
+
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.description}")
+        lines.append(f"# TYPE {metric.name} {metric.metric_type}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{labels} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Опрос метрик каждые несколько секунд не должен засорять лог
+        pass
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """Запускает HTTP-сервер с /metrics в фоновом потоке и возвращает его."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(
+        target=server.serve_forever, name="metrics", daemon=True
+    ).start()
+    logger.info(f"📈 Метрики: http://{host}:{port}/metrics")
+    return server
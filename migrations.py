@@ -0,0 +1,347 @@
+import json
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory-блокировки: миграции не выполняются параллельно
+# из нескольких процессов бота
+MIGRATIONS_LOCK_ID = 7312001
+
+# Версионированные изменения схемы: (версия, описание, SQL-команды).
+# Уже применённые версии не выполняются повторно, новые добавляются в конец.
+MIGRATIONS = [
+    (
+        1,
+        "Индекс последних фраз пользователя и списка удаления",
+        [
+            """
+            CREATE INDEX IF NOT EXISTS idx_user_phrases_user_added
+            ON user_phrases (user_id, added_at DESC, phrase_id DESC)
+            INCLUDE (is_learned)
+            """,
+        ],
+    ),
+    (
+        2,
+        "Частичный индекс изученных фраз пользователя",
+        [
+            """
+            CREATE INDEX IF NOT EXISTS idx_user_phrases_user_learned
+            ON user_phrases (user_id)
+            WHERE is_learned
+            """,
+        ],
+    ),
+    (
+        3,
+        "Случайный ключ фраз для выбора вариантов ответа по индексу",
+        [
+            """
+            ALTER TABLE phrases
+            ADD COLUMN IF NOT EXISTS random_key DOUBLE PRECISION NOT NULL DEFAULT random()
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_phrases_random_key
+            ON phrases (random_key)
+            INCLUDE (phrase_id, english_phrase, russian_translation)
+            """,
+        ],
+    ),
+    (
+        4,
+        "Журнал показов карточек и последняя показанная фраза в users",
+        [
+            """
+            ALTER TABLE users
+            ADD COLUMN IF NOT EXISTS last_shown_phrase_id INTEGER
+            REFERENCES phrases(phrase_id) ON DELETE SET NULL
+            """,
+            """
+            UPDATE users u
+            SET last_shown_phrase_id = (
+                SELECT up.phrase_id
+                FROM user_phrases up
+                WHERE up.user_id = u.user_id
+                ORDER BY up.added_at DESC
+                LIMIT 1
+            )
+            WHERE u.last_shown_phrase_id IS NULL
+            """,
+            # Append-only журнал без внешних ключей, секционированный по месяцам
+            """
+            CREATE TABLE IF NOT EXISTS card_impressions (
+                user_id BIGINT NOT NULL,
+                phrase_id INTEGER NOT NULL,
+                shown_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            ) PARTITION BY RANGE (shown_at)
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS card_impressions_default
+            PARTITION OF card_impressions DEFAULT
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_card_impressions_user_shown
+            ON card_impressions (user_id, shown_at)
+            """,
+        ],
+    ),
+    (
+        5,
+        "Владелец фраз: общий каталог и личные фразы пользователей",
+        [
+            """
+            ALTER TABLE phrases
+            ADD COLUMN IF NOT EXISTS owner_id BIGINT
+            REFERENCES users(user_id) ON DELETE CASCADE
+            """,
+            # Свои фразы, которые видел только их автор, становятся личными.
+            # Фразы, которые уже попадались другим пользователям, остаются
+            # в общем каталоге, чтобы никто не потерял карточки с прогрессом.
+            """
+            UPDATE phrases p
+            SET owner_id = owners.user_id
+            FROM (
+                SELECT phrase_id, MIN(user_id) AS user_id
+                FROM user_phrases
+                GROUP BY phrase_id
+                HAVING COUNT(*) = 1
+            ) owners
+            WHERE p.phrase_id = owners.phrase_id AND p.category = 'custom'
+            """,
+            # Уникальность отдельно в общем каталоге и в фразах каждого пользователя
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_phrases_global_unique
+            ON phrases (english_phrase, russian_translation)
+            WHERE owner_id IS NULL
+            """,
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_phrases_owner_unique
+            ON phrases (owner_id, english_phrase, russian_translation)
+            WHERE owner_id IS NOT NULL
+            """,
+            """
+            ALTER TABLE phrases
+            DROP CONSTRAINT IF EXISTS phrases_english_phrase_russian_translation_key
+            """,
+            # Выбор карточек и вариантов читает общий каталог и фразы одного
+            # пользователя, не затрагивая чужие личные фразы
+            """
+            CREATE INDEX IF NOT EXISTS idx_phrases_global_random_key
+            ON phrases (random_key)
+            INCLUDE (phrase_id, english_phrase, russian_translation)
+            WHERE owner_id IS NULL
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_phrases_owner_random_key
+            ON phrases (owner_id, random_key)
+            INCLUDE (phrase_id, english_phrase, russian_translation)
+            WHERE owner_id IS NOT NULL
+            """,
+            "DROP INDEX IF EXISTS idx_phrases_random_key",
+        ],
+    ),
+    (
+        6,
+        "Выбранные колода и уровень пользователя, индексы фильтров каталога",
+        [
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS study_category VARCHAR(100)",
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS study_level VARCHAR(10)",
+            # Колода с уровнем или без него: выбор карточки и отрезок random_key
+            # для вариантов читают только строки этой колоды
+            """
+            CREATE INDEX IF NOT EXISTS idx_phrases_global_category_level
+            ON phrases (category, level, random_key)
+            INCLUDE (phrase_id, english_phrase, russian_translation)
+            WHERE owner_id IS NULL
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_phrases_global_level
+            ON phrases (level, random_key)
+            INCLUDE (phrase_id, english_phrase, russian_translation)
+            WHERE owner_id IS NULL
+            """,
+        ],
+    ),
+]
+
+
+def apply_migrations(conn):
+    """
+    Применяет недостающие миграции (идемпотентно).
+    Каждая версия выполняется в своей транзакции.
+    """
+    cur = conn.cursor()
+
+    try:
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        conn.commit()
+
+        for version, description, statements in MIGRATIONS:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATIONS_LOCK_ID,))
+            cur.execute(
+                "SELECT 1 FROM schema_migrations WHERE version = %s", (version,)
+            )
+            if cur.fetchone():
+                conn.commit()
+                continue
+
+            logger.info(f"🛠️ Миграция {version}: {description}")
+            for statement in statements:
+                cur.execute(statement)
+
+            cur.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                (version, description),
+            )
+            conn.commit()
+
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def hot_queries():
+    """
+    Горячие запросы - те же тексты, что выполняет database.py, с примерными
+    параметрами: (название, запрос, параметры). Параметры-словарь - запрос
+    с :name (conn.run), кортеж - с %s (курсор). CATALOG_DECKS_SQL сюда
+    не входит: он читает весь каталог намеренно и кэшируется.
+    """
+    import database
+
+    deck = database._deck_filter("general", "A2")[0]
+    level = database._deck_filter(level="A2")[0]
+    keyset = database.USER_PHRASES_KEYSET_SQL.format(op="<")
+    slice_params = {"phrase_id": 1, "start_key": 0.5, "fetch_limit": 18}
+    study_params = {
+        "user_id": 1,
+        "exclude_phrase_ids": [1],
+        "limit": 10,
+        "start_key": 0.5,
+    }
+
+    return [
+        ("get_study_settings", database.STUDY_SETTINGS_SQL, {"user_id": 1}),
+        (
+            "get_user_phrases_page",
+            database.USER_PHRASES_PAGE_SQL.format(keyset=keyset, order="DESC"),
+            (1, 1, 1, 21),
+        ),
+        (
+            "get_random_phrase_for_user",
+            database.STUDY_PHRASES_SQL.format(deck_filter=""),
+            study_params,
+        ),
+        (
+            "get_random_phrase_for_user (колода и уровень)",
+            database.STUDY_PHRASES_SQL.format(deck_filter=deck),
+            {**study_params, "category": "general", "level": "A2"},
+        ),
+        (
+            "get_wrong_phrases",
+            database.CATALOG_SLICE_SQL.format(deck_filter=""),
+            slice_params,
+        ),
+        (
+            "get_wrong_phrases (колода и уровень)",
+            database.CATALOG_SLICE_SQL.format(deck_filter=deck),
+            {**slice_params, "category": "general", "level": "A2"},
+        ),
+        (
+            "get_wrong_phrases (уровень)",
+            database.CATALOG_SLICE_SQL.format(deck_filter=level),
+            {**slice_params, "level": "A2"},
+        ),
+        (
+            "add_custom_phrase (поиск существующей)",
+            database.FIND_PHRASE_SQL,
+            ("hello", "привет", 1, "hello", "привет"),
+        ),
+        (
+            "add_custom_phrase (личная фраза)",
+            database.FIND_OWN_PHRASE_SQL,
+            (1, "hello", "привет"),
+        ),
+        ("get_user_stats", database.USER_STATS_SQL, {"user_id": 1}),
+    ]
+
+
+HOT_TABLES = {"users", "phrases", "user_phrases", "user_stats"}
+
+
+def _find_seq_scans(plan):
+    """
+    Возвращает таблицы, которые план читает целиком: последовательным
+    сканированием или полным проходом по индексу (без условия Index Cond).
+    """
+    found = []
+    node = plan.get("Node Type")
+    if plan.get("Relation Name") in HOT_TABLES and (
+        node == "Seq Scan"
+        or (node in ("Index Scan", "Index Only Scan") and "Index Cond" not in plan)
+    ):
+        found.append(f"{plan['Relation Name']} ({node})")
+    for child in plan.get("Plans", []):
+        found.extend(_find_seq_scans(child))
+    return found
+
+
+def test_query_plans():
+    """
+    Регрессионная проверка схемы: ни один горячий запрос не должен
+    скатываться в последовательное сканирование.
+    Seq Scan запрещается планировщику, поэтому в плане он останется,
+    только если подходящего индекса нет.
+    """
+    from database import get_connection
+
+    conn = get_connection()
+    cur = conn.cursor()
+    failures = []
+    queries = hot_queries()
+
+    try:
+        cur.execute("SET LOCAL enable_seqscan = off")
+        for name, query, params in queries:
+            if isinstance(params, dict):
+                plan = conn.run(f"EXPLAIN (FORMAT JSON) {query}", **params)[0][0]
+            else:
+                cur.execute(f"EXPLAIN (FORMAT JSON) {query}", params)
+                plan = cur.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+
+            seq_scans = _find_seq_scans(plan[0]["Plan"])
+            if seq_scans:
+                failures.append(f"{name}: полное чтение {', '.join(seq_scans)}")
+    finally:
+        conn.rollback()
+        cur.close()
+        conn.close()
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    assert not failures, "Горячие запросы без индекса"
+    print(f"✅ Все {len(queries)} горячих запросов используют индексы")
+
+
+if __name__ == "__main__":
+    from database import init_db
+
+    init_db()
+    try:
+        test_query_plans()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
@@ -3,6 +3,10 @@ import os
 import psycopg2
 from config import DATABASE_URL
 
+# Колода и уровень фраз из CSV без колонок category/level
+DEFAULT_CATEGORY = 'general'
+DEFAULT_LEVEL = 'A2'
+
 
 def find_csv_file():
     """Поиск CSV файла в различных возможных местах"""
@@ -85,6 +89,7 @@ def load_phrases_from_csv(csv_file_path):
     cur = conn.cursor()
 
     phrases_loaded = 0
+    phrases_updated = 0
     errors = 0
 
     # Анализ файла
@@ -101,6 +106,25 @@ def load_phrases_from_csv(csv_file_path):
             reader = csv.DictReader(file, delimiter=delimiter)
             total_rows = 0
 
+            header = {str(name).strip().lower() for name in reader.fieldnames or []}
+            if header & {'category', 'deck', 'level'}:
+                on_conflict = """
+                    DO UPDATE SET category = EXCLUDED.category, level = EXCLUDED.level
+                    WHERE (phrases.category, phrases.level)
+                        IS DISTINCT FROM (EXCLUDED.category, EXCLUDED.level)
+                """
+            else:
+                # Без колонок колоды не затираем уже заданные значения
+                on_conflict = "DO NOTHING"
+
+            insert_sql = f"""
+                INSERT INTO phrases (english_phrase, russian_translation, category, level)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (english_phrase, russian_translation)
+                    WHERE owner_id IS NULL {on_conflict}
+                RETURNING xmax = 0
+            """
+
             for row_num, row in enumerate(reader, 1):
                 total_rows = row_num
                 try:
@@ -118,25 +142,38 @@ def load_phrases_from_csv(csv_file_path):
                         list(row.values())[1] if len(row.values()) > 1 else ''
                     )
 
+                    # Колода и уровень, если в CSV есть такие колонки
+                    columns = {
+                        str(key).strip().lower(): value
+                        for key, value in row.items()
+                        if key is not None
+                    }
+                    category = (
+                        columns.get('category') or columns.get('deck') or DEFAULT_CATEGORY
+                    )
+                    level = columns.get('level') or DEFAULT_LEVEL
+
                     # Очистка данных
                     english_phrase = str(english_phrase).strip()
                     russian_translation = str(russian_translation).strip()
+                    category = str(category).strip().lower() or DEFAULT_CATEGORY
+                    level = str(level).strip().upper() or DEFAULT_LEVEL
 
                     # Пропускаем пустые строки
                     if not english_phrase or not russian_translation:
                         continue
 
-                    # Добавляем фразу в базу
-                    cur.execute("""
-                        INSERT INTO phrases (english_phrase, russian_translation, category, level)
-                        VALUES (%s, %s, %s, %s)
-                        ON CONFLICT (english_phrase, russian_translation) DO NOTHING
-                    """, (english_phrase, russian_translation, 'general', 'A2'))
+                    # Добавляем фразу в базу; у уже загруженной фразы обновляем
+                    # колоду и уровень, если CSV их задаёт
+                    cur.execute(insert_sql, (english_phrase, russian_translation, category, level))
+                    row = cur.fetchone()
 
-                    if cur.rowcount > 0:
+                    if row and row[0]:
                         phrases_loaded += 1
                         if phrases_loaded <= 3:  # Показываем первые 3 для подтверждения
                             print(f"✅ [{phrases_loaded}] '{english_phrase}' -> '{russian_translation}'")
+                    elif row:
+                        phrases_updated += 1
 
                 except Exception as e:
                     errors += 1
@@ -149,6 +186,7 @@ def load_phrases_from_csv(csv_file_path):
         print("\n" + "=" * 60)
         print(f"📊 РЕЗУЛЬТАТ:")
         print(f"✅ Успешно загружено: {phrases_loaded} фраз")
+        print(f"🔄 Обновлены колода и уровень: {phrases_updated} фраз")
         print(f"📁 Обработано строк: {total_rows}")
         print(f"❌ Ошибок: {errors}")
 
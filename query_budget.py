@@ -0,0 +1,241 @@
+import contextlib
+import contextvars
+import functools
+import logging
+
+from metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Счётчик запросов и соединений с БД в текущем контексте (обновление,
+# обработчик или блок в проверке). Его увеличивает слой соединений database.py.
+
+budget_exceeded_total = Counter(
+    "bot_query_budget_exceeded_total",
+    "Превышения бюджета запросов к БД",
+    labels=("handler",),
+)
+handler_queries = Histogram(
+    "bot_handler_db_queries",
+    "Запросы к БД за один вызов обработчика",
+    labels=("handler",),
+    buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 30),
+)
+
+_current_stats = contextvars.ContextVar("query_stats", default=None)
+
+
+class QueryStats:
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.queries = 0
+        self.connections = 0
+
+    def __repr__(self):
+        return f"QueryStats(queries={self.queries}, connections={self.connections})"
+
+
+def count_query():
+    stats = _current_stats.get()
+    while stats is not None:
+        stats.queries += 1
+        stats = stats.parent
+
+
+def count_connection():
+    stats = _current_stats.get()
+    while stats is not None:
+        stats.connections += 1
+        stats = stats.parent
+
+
+@contextlib.contextmanager
+def track_queries():
+    """Считает запросы и соединения внутри блока (вложенные блоки тоже учитываются)."""
+    stats = QueryStats(parent=_current_stats.get())
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+@contextlib.contextmanager
+def assert_query_budget(max_queries, max_connections=None, name="блок"):
+    """
+    Для проверок: падает с AssertionError, если код внутри блока
+    выполнил больше max_queries запросов или взял больше max_connections соединений.
+    """
+    with track_queries() as stats:
+        yield stats
+
+    assert stats.queries <= max_queries, (
+        f"{name}: {stats.queries} запросов к БД при бюджете {max_queries}"
+    )
+    if max_connections is not None:
+        assert stats.connections <= max_connections, (
+            f"{name}: {stats.connections} соединений при бюджете {max_connections}"
+        )
+
+
+def query_budget(max_queries, max_connections=None):
+    """
+    Декоратор обработчика: при превышении бюджета пишет предупреждение
+    в лог и увеличивает bot_query_budget_exceeded_total, не прерывая работу.
+    """
+
+    def decorator(handler):
+        name = handler.__name__
+
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            with track_queries() as stats:
+                try:
+                    return handler(*args, **kwargs)
+                finally:
+                    handler_queries.observe(stats.queries, handler=name)
+                    if stats.queries > max_queries or (
+                        max_connections is not None
+                        and stats.connections > max_connections
+                    ):
+                        budget_exceeded_total.inc(handler=name)
+                        logger.warning(
+                            f"⚠️ {name}: {stats.queries} запросов и "
+                            f"{stats.connections} соединений при бюджете "
+                            f"{max_queries}/{max_connections}"
+                        )
+
+        wrapper.max_queries = max_queries
+        wrapper.max_connections = max_connections
+        return wrapper
+
+    return decorator
+
+
+def test_query_budgets():
+    """
+    Бюджеты горячих функций database.py на живой базе (DATABASE_URL).
+    Новая функция или запрос, раздувающий горячий путь, уронит проверку.
+    """
+    import database
+
+    database.init_db()
+    user_id = 999_000_001
+    database.add_user(user_id, "budget_test", "Budget")
+
+    try:
+        with assert_query_budget(1, 1, "get_last_phrase_id"):
+            last_id = database.get_last_phrase_id(user_id)
+
+        with assert_query_budget(1, 1, "get_study_settings"):
+            database.get_study_settings(user_id)
+
+        with assert_query_budget(1, 1, "get_random_phrase_for_user"):
+            phrase = database.get_random_phrase_for_user(user_id, last_id)
+        assert phrase, "Для проверки нужна хотя бы одна фраза в каталоге"
+
+        with assert_query_budget(4, 1, "mark_phrase_shown"):
+            database.mark_phrase_shown(user_id, phrase["phrase_id"])
+
+        with assert_query_budget(1, 1, "get_wrong_phrases"):
+            database.get_wrong_phrases(phrase["phrase_id"], user_id, 6)
+
+        with assert_query_budget(3, 1, "update_user_progress"):
+            database.update_user_progress(user_id, phrase["phrase_id"], True)
+
+        with assert_query_budget(1, 1, "get_user_stats"):
+            database.get_user_stats(user_id)
+
+        with assert_query_budget(2, 1, "get_user_phrases_page"):
+            database.get_user_phrases_page(user_id)
+    finally:
+        conn = database.get_connection()
+        cur = conn.cursor()
+        cur.execute("DELETE FROM users WHERE user_id = %s", (user_id,))
+        cur.execute("DELETE FROM card_impressions WHERE user_id = %s", (user_id,))
+        conn.commit()
+        cur.close()
+        conn.close()
+
+    print("✅ Горячие функции укладываются в бюджет запросов")
+
+
+def test_handler_budgets():
+    """
+    Бюджеты обработчиков main.py на живой базе (DATABASE_URL, BOT_TOKEN):
+    Bot API подменяется ответом без сети, и каждый обработчик должен уложиться
+    в max_queries и max_connections своего @query_budget.
+    """
+    import json
+    import time
+    from types import SimpleNamespace
+
+    from telebot import apihelper, types
+
+    import database
+    import main
+
+    database.init_db()
+    user_id = 999_000_002
+
+    def fake_request(method, url, **kwargs):
+        text = json.dumps({
+            "ok": True,
+            "result": {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+            },
+        })
+        return SimpleNamespace(status_code=200, text=text, json=lambda: json.loads(text))
+
+    def message(text):
+        return types.Message.de_json({
+            "message_id": 1,
+            "from": {"id": user_id, "is_bot": False, "first_name": "Budget"},
+            "chat": {"id": user_id, "type": "private"},
+            "date": int(time.time()),
+            "text": text,
+        })
+
+    def check(handler, text):
+        with track_queries() as stats:
+            handler(message(text))
+        name = handler.__name__
+        assert stats.queries > 0, f"{name}: обработчик не обратился к БД"
+        assert stats.queries <= handler.max_queries, (
+            f"{name}: {stats.queries} запросов к БД при бюджете {handler.max_queries}"
+        )
+        assert stats.connections <= handler.max_connections, (
+            f"{name}: {stats.connections} соединений при бюджете "
+            f"{handler.max_connections}"
+        )
+
+    sender, apihelper.CUSTOM_REQUEST_SENDER = apihelper.CUSTOM_REQUEST_SENDER, fake_request
+    try:
+        check(main.start_bot, "/start")
+        check(main.show_next_phrase, main.Command.NEXT)
+        with main.bot.retrieve_data(user_id, user_id) as data:
+            answer = data["target_phrase"]
+        check(main.check_answer, answer)
+        check(main.show_stats, "/stats")
+    finally:
+        apihelper.CUSTOM_REQUEST_SENDER = sender
+        conn = database.get_connection()
+        cur = conn.cursor()
+        cur.execute("DELETE FROM users WHERE user_id = %s", (user_id,))
+        cur.execute("DELETE FROM card_impressions WHERE user_id = %s", (user_id,))
+        conn.commit()
+        cur.close()
+        conn.close()
+
+    print("✅ Обработчики укладываются в бюджет запросов")
+
+
+if __name__ == "__main__":
+    # database.py считает запросы в импортированном модуле query_budget,
+    # а не в __main__, поэтому проверки запускаются из него
+    import query_budget
+
+    query_budget.test_query_budgets()
+    query_budget.test_handler_budgets()
@@ -0,0 +1,174 @@
+import functools
+import logging
+import threading
+import time
+
+import config
+from metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+rate_limited_total = Counter(
+    "bot_rate_limited_total",
+    "Обновления, отклонённые ограничением частоты",
+    labels=("handler",),
+)
+
+
+class TokenBucketLimiter:
+    """
+    Token bucket в памяти процесса: у каждого пользователя до burst токенов,
+    которые восполняются со скоростью rate токенов в секунду.
+    """
+
+    # Как часто удалять заполненные ведра неактивных пользователей (сек)
+    CLEANUP_INTERVAL = 300
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._last_cleanup = time.monotonic()
+
+    def allow(self, key):
+        now = time.monotonic()
+
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+
+            if now - self._last_cleanup > self.CLEANUP_INTERVAL:
+                self._cleanup(now)
+
+        return allowed
+
+    def _cleanup(self, now):
+        # Ведро, которое успело бы заполниться, ничем не отличается от нового
+        full_after = self.burst / self.rate
+        self._buckets = {
+            key: (tokens, updated_at)
+            for key, (tokens, updated_at) in self._buckets.items()
+            if now - updated_at < full_after
+        }
+        self._last_cleanup = now
+
+
+class RedisTokenBucketLimiter:
+    """
+    Тот же token bucket в Redis: лимит общий для всех процессов бота.
+    Пакет redis нужен только при заданном RATE_LIMIT_REDIS_URL.
+    """
+
+    # Атомарно пересчитывает и списывает токен; время берётся из Redis,
+    # чтобы разница часов между процессами не влияла на лимит
+    SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+    local tokens = tonumber(bucket[1]) or burst
+    local updated_at = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + (now - updated_at) * rate)
+
+    local allowed = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    end
+
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate))
+    return allowed
+    """
+
+    def __init__(self, url, rate, burst):
+        import redis
+
+        self.rate = rate
+        self.burst = burst
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    def allow(self, key):
+        try:
+            return bool(
+                self._script(keys=[f"ratelimit:{key}"], args=[self.rate, self.burst])
+            )
+        except Exception as e:
+            # Недоступный Redis не должен останавливать бота
+            logger.error(f"Ошибка Redis при проверке лимита: {e}")
+            return True
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Общий ограничитель: Redis, если задан RATE_LIMIT_REDIS_URL, иначе в памяти."""
+    global _limiter
+
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = _create_limiter()
+        return _limiter
+
+
+def _create_limiter():
+    if config.RATE_LIMIT_REDIS_URL:
+        try:
+            limiter = RedisTokenBucketLimiter(
+                config.RATE_LIMIT_REDIS_URL,
+                config.RATE_LIMIT_PER_SECOND,
+                config.RATE_LIMIT_BURST,
+            )
+            logger.info("🚧 Ограничение частоты: Redis")
+            return limiter
+        except ImportError:
+            logger.warning("Пакет redis не установлен, лимит хранится в памяти")
+
+    return TokenBucketLimiter(config.RATE_LIMIT_PER_SECOND, config.RATE_LIMIT_BURST)
+
+
+def rate_limited(handler):
+    """
+    Пропускает сообщение в обработчик, только если у пользователя есть токен.
+    Лишние нажатия отбрасываются молча: без запросов к БД и ответов.
+    """
+
+    @functools.wraps(handler)
+    def wrapper(message, *args, **kwargs):
+        if not get_rate_limiter().allow(message.from_user.id):
+            rate_limited_total.inc(handler=handler.__name__)
+            logger.debug(
+                f"Лимит частоты: {handler.__name__} от {message.from_user.id}"
+            )
+            return None
+        return handler(message, *args, **kwargs)
+
+    return wrapper
+
+
+def test_token_bucket():
+    """Проверка: burst проходит сразу, затем токены восполняются по rate."""
+    limiter = TokenBucketLimiter(rate=10, burst=3)
+
+    assert all(limiter.allow(1) for _ in range(3))
+    assert not limiter.allow(1), "Четвёртый запрос подряд должен быть отклонён"
+    assert limiter.allow(2), "Лимит считается отдельно для каждого пользователя"
+
+    time.sleep(0.15)
+    assert limiter.allow(1), "Токен должен восполниться за 0.1 сек"
+    print("✅ Token bucket работает корректно")
+
+
+if __name__ == "__main__":
+    test_token_bucket()
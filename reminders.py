@@ -1,8 +1,15 @@
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
-from database import get_connection  # Используем нашу функцию подключения
+import config
+from database import (
+    check_read_replicas,
+    ensure_impression_partitions,
+    get_connection,
+    get_user_phrase_count,
+    refresh_admin_stats,
+)
 from telebot import TeleBot
 import logging
+import threading
+import time
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -11,8 +18,27 @@ logger = logging.getLogger(__name__)
 class ReminderSystem:
     def __init__(self, bot: TeleBot):
         self.bot = bot
-        self.scheduler = BackgroundScheduler()
-        self.setup_reminders()
+        # Планировщик создаётся в start(), уже после запуска бота
+        self.scheduler = None
+        # Остановка бота: рассылки прерываются после текущего пользователя
+        self._stopping = threading.Event()
+        self._running_jobs = 0
+        self._jobs_done = threading.Condition()
+
+    def _tracked(self, func):
+        """Задача планировщика, окончания которой дожидается shutdown()."""
+
+        def job():
+            with self._jobs_done:
+                self._running_jobs += 1
+            try:
+                func()
+            finally:
+                with self._jobs_done:
+                    self._running_jobs -= 1
+                    self._jobs_done.notify_all()
+
+        return job
 
     def get_all_users(self):
         """Получает список всех пользователей бота"""
@@ -32,21 +58,12 @@ class ReminderSystem:
 
     def get_user_stats(self, user_id):
         """Получает статистику пользователя"""
-        conn = get_connection()  # ИСПРАВЛЕНО: убрали self.
-        cur = conn.cursor()
-
         try:
-            # Количество изучаемых фраз
-            cur.execute("SELECT COUNT(*) FROM user_phrases WHERE user_id = %s", (user_id,))
-            total_phrases = cur.fetchone()[0]
-
-            return total_phrases
+            # Количество изучаемых фраз (из счётчиков user_stats)
+            return get_user_phrase_count(user_id)
         except Exception as e:
             logger.error(f"Ошибка при получении статистики пользователя {user_id}: {e}")
             return 0
-        finally:
-            cur.close()
-            conn.close()
 
     def send_daily_reminder(self):
         """Отправляет ежедневное напоминание всем пользователям"""
@@ -54,6 +71,10 @@ class ReminderSystem:
         logger.info(f"Отправка напоминаний для {len(users)} пользователей")
 
         for user_id in users:
+            if self._stopping.is_set():
+                logger.warning("Рассылка напоминаний прервана остановкой бота")
+                break
+
             try:
                 total_phrases = self.get_user_stats(user_id)
 
@@ -82,6 +103,10 @@ class ReminderSystem:
         users = self.get_all_users()
 
         for user_id in users:
+            if self._stopping.is_set():
+                logger.warning("Мотивационная рассылка прервана остановкой бота")
+                break
+
             try:
                 total_phrases = self.get_user_stats(user_id)
 
@@ -98,12 +123,29 @@ class ReminderSystem:
                 if "bot was blocked" not in str(e).lower() and "chat not found" not in str(e).lower():
                     logger.error(f"Не удалось отправить мотивационное напоминание пользователю {user_id}: {e}")
 
+    def refresh_admin_stats(self):
+        """Обновляет снимок статистики для команды /users"""
+        try:
+            refresh_admin_stats()
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении статистики для администратора: {e}")
+
+    def ensure_impression_partitions(self):
+        """Заранее создаёт месячные секции журнала показов"""
+        try:
+            ensure_impression_partitions()
+        except Exception as e:
+            logger.error(f"Ошибка при создании секций журнала показов: {e}")
+
     def setup_reminders(self):
         """Настраивает расписание напоминаний"""
+        from apscheduler.triggers.cron import CronTrigger
+        from apscheduler.triggers.interval import IntervalTrigger
+
         try:
             # Ежедневное напоминание в 19:00
             self.scheduler.add_job(
-                self.send_daily_reminder,
+                self._tracked(self.send_daily_reminder),
                 trigger=CronTrigger(hour=19, minute=0),  # 19:00 каждый день
                 id='daily_reminder',
                 name='Ежедневное напоминание о занятиях'
@@ -111,12 +153,37 @@ class ReminderSystem:
 
             # Мотивационное напоминание в субботу в 12:00
             self.scheduler.add_job(
-                self.send_motivational_reminder,
+                self._tracked(self.send_motivational_reminder),
                 trigger=CronTrigger(day_of_week='sat', hour=12, minute=0),  # Суббота 12:00
                 id='weekly_motivation',
                 name='Еженедельное мотивационное напоминание'
             )
 
+            # Пересчёт снимка статистики для /users
+            self.scheduler.add_job(
+                self._tracked(self.refresh_admin_stats),
+                trigger=IntervalTrigger(minutes=config.ADMIN_STATS_REFRESH_MINUTES),
+                id='admin_stats_refresh',
+                name='Обновление статистики для администратора'
+            )
+
+            # Секции журнала показов на следующие месяцы
+            self.scheduler.add_job(
+                self._tracked(self.ensure_impression_partitions),
+                trigger=CronTrigger(hour=3, minute=0),
+                id='impression_partitions',
+                name='Секции журнала показов карточек'
+            )
+
+            # Проверка реплик для чтения (доступность и отставание)
+            if config.DATABASE_READ_URLS:
+                self.scheduler.add_job(
+                    self._tracked(check_read_replicas),
+                    trigger=IntervalTrigger(seconds=30),
+                    id='replica_health',
+                    name='Проверка реплик базы данных'
+                )
+
             # Для тестирования - раскомментируйте следующие строки:
             # self.scheduler.add_job(
             #     self.send_daily_reminder,
@@ -132,15 +199,37 @@ class ReminderSystem:
             logger.error(f"Ошибка при настройке напоминаний: {e}")
 
     def start(self):
-        """Запускает систему напоминаний"""
+        """Создаёт планировщик и запускает систему напоминаний"""
+        from apscheduler.schedulers.background import BackgroundScheduler
+
         try:
+            self.scheduler = BackgroundScheduler()
+            self.setup_reminders()
             self.scheduler.start()
             logger.info("🚀 Система напоминаний запущена!")
         except Exception as e:
             logger.error(f"Ошибка при запуске системы напоминаний: {e}")
 
-    def shutdown(self):
-        """Останавливает систему напоминаний"""
-        if self.scheduler.running:
-            self.scheduler.shutdown()
-            logger.info("🛑 Система напоминаний остановлена")
\ No newline at end of file
+    def shutdown(self, timeout=None):
+        """
+        Останавливает систему напоминаний: новые задачи не запускаются,
+        рассылки прерываются, а начатые задачи ждём не дольше timeout секунд.
+        """
+        self._stopping.set()
+        if self.scheduler is None or not self.scheduler.running:
+            return
+
+        self.scheduler.shutdown(wait=False)
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._jobs_done:
+            while self._running_jobs:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    logger.warning(
+                        f"🛑 Задачи напоминаний не завершились: {self._running_jobs}"
+                    )
+                    return
+                self._jobs_done.wait(remaining)
+
+        logger.info("🛑 Система напоминаний остановлена")
\ No newline at end of file
@@ -0,0 +1,84 @@
+import inspect
+import logging
+import signal
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ShutdownManager:
+    """
+    Согласованная остановка бота по SIGTERM/SIGINT.
+
+    request() только снимает бота с приёма обновлений (безопасно вызывать
+    из обработчика сигнала), а run() по порядку выполняет шаги остановки.
+    У всех шагов общий дедлайн timeout секунд с момента запроса;
+    шаг, принимающий аргумент, получает оставшееся время.
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self._on_request = []
+        self._steps = []
+        self._requested_at = None
+        self._lock = threading.Lock()
+        self._done = False
+
+    def on_request(self, func):
+        """Быстрое действие в момент запроса остановки (без ожиданий)."""
+        self._on_request.append(func)
+
+    def add_step(self, name, func):
+        self._steps.append((name, func))
+
+    def install_signal_handlers(self):
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self._handle_signal)
+
+    def _handle_signal(self, signum, frame):
+        logger.info(f"🛑 Получен сигнал {signal.Signals(signum).name}, останавливаемся...")
+        self.request()
+
+    @property
+    def requested(self):
+        return self._requested_at is not None
+
+    def request(self):
+        with self._lock:
+            if self._requested_at is not None:
+                return
+            self._requested_at = time.monotonic()
+
+        for func in self._on_request:
+            try:
+                func()
+            except Exception as e:
+                logger.error(f"Ошибка при запросе остановки: {e}")
+
+    def remaining(self):
+        return max(self._requested_at + self.timeout - time.monotonic(), 0)
+
+    def run(self):
+        """Выполняет шаги остановки (один раз)."""
+        self.request()
+
+        with self._lock:
+            if self._done:
+                return
+            self._done = True
+
+        for name, func in self._steps:
+            started = time.monotonic()
+            try:
+                if inspect.signature(func).parameters:
+                    func(self.remaining())
+                else:
+                    func()
+            except Exception as e:
+                logger.error(f"Ошибка на шаге остановки '{name}': {e}")
+                continue
+
+            logger.info(f"🛑 {name}: {time.monotonic() - started:.2f} с")
+
+        logger.info("👋 Бот остановлен")
@@ -0,0 +1,358 @@
+import logging
+import random
+import threading
+import time
+import zlib
+
+import config
+
+try:
+    import numpy as np
+except ImportError:  # numpy необязателен: без него варианты выбираются в SQL
+    np = None
+
+logger = logging.getLogger(__name__)
+
+NGRAM = 3
+# Фразы с почти одинаковым английским текстом не годятся в варианты ответа
+DUPLICATE_SIMILARITY = 0.98
+# Сколько элементов матрицы сходства считать за один блок (~64 МБ float32)
+BLOCK_ELEMENTS = 16_000_000
+COLUMNS = ["phrase_id", "english_phrase", "russian_translation"]
+# Владелец удалённой фразы: такую фразу не видит никто
+REMOVED = object()
+
+
+def _features(text, dimensions):
+    """Номера признаков фразы: символьные триграммы и слова (hashing trick)."""
+    text = " ".join(text.lower().split())
+    padded = f" {text} "
+    grams = [padded[i:i + NGRAM] for i in range(len(padded) - NGRAM + 1)]
+    grams.extend(f"w:{word}" for word in text.split())
+    return [zlib.crc32(gram.encode("utf-8")) % dimensions for gram in grams]
+
+
+def vectorize(texts, dimensions):
+    """Нормированные векторы признаков фраз, матрица (len(texts), dimensions)."""
+    rows, columns = [], []
+    for row, text in enumerate(texts):
+        features = _features(text, dimensions)
+        rows.extend([row] * len(features))
+        columns.extend(features)
+
+    vectors = np.zeros((len(texts), dimensions), dtype=np.float32)
+    np.add.at(vectors, (np.array(rows, dtype=np.intp), np.array(columns, dtype=np.intp)), 1)
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def _as_row(phrase):
+    """Фраза в виде кортежа (phrase_id, english, russian, owner_id)."""
+    if isinstance(phrase, dict):
+        return tuple(phrase[column] for column in COLUMNS) + (phrase.get("owner_id"),)
+    phrase = tuple(phrase)
+    return phrase if len(phrase) == 4 else phrase + (None,)
+
+
+class SimilarityIndex:
+    """
+    Индекс похожих фраз для вариантов ответа.
+
+    Для каждой фразы заранее хранятся neighbours самых похожих на неё
+    по английскому тексту (косинус векторов триграмм), поэтому подбор
+    вариантов - чтение одной строки массива без запросов к БД.
+    Новые фразы добавляются инкрементально: считается сходство только
+    с ними, и соседи старых фраз обновляются, если новая фраза ближе.
+    Личные фразы (с owner_id) предлагаются в варианты только их владельцу.
+    """
+
+    def __init__(self, dimensions=256, neighbours=20, max_candidates=20000):
+        self.dimensions = dimensions
+        self.neighbours = neighbours
+        # При построении соседи ищутся среди не более max_candidates фраз,
+        # иначе время построения росло бы квадратично с каталогом
+        self.max_candidates = max_candidates
+        self.ready = False
+
+        self._lock = threading.Lock()
+        self._size = 0
+        self._vectors = np.zeros((0, dimensions), dtype=np.float32)
+        self._top = np.zeros((0, neighbours), dtype=np.int32)
+        self._scores = np.zeros((0, neighbours), dtype=np.float32)
+        self._rows = {}
+        self._phrases = []
+        # Фразы, добавленные во время построения индекса
+        self._pending = []
+
+    def __len__(self):
+        return self._size
+
+    def build(self, phrases):
+        """Строит индекс с нуля; phrases - строки (phrase_id, english, russian[, owner_id])."""
+        started = time.perf_counter()
+        phrases = [_as_row(phrase) for phrase in phrases]
+
+        self._reset(len(phrases))
+        self._append(phrases)
+
+        candidates = np.arange(self._size)
+        if self._size > self.max_candidates:
+            candidates = np.sort(
+                np.random.default_rng(0).choice(
+                    self._size, self.max_candidates, replace=False
+                )
+            )
+
+        for start, stop in self._blocks(0, self._size, len(candidates)):
+            top, scores = self._nearest(self._vectors[start:stop], candidates)
+            self._top[start:stop] = top
+            self._scores[start:stop] = scores
+
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self.ready = True
+
+        self.add_phrases(pending)
+        logger.info(
+            f"🧭 Индекс похожих фраз: {self._size} фраз "
+            f"за {time.perf_counter() - started:.1f} с"
+        )
+
+    def add_phrases(self, phrases):
+        """
+        Добавляет новые фразы (словари с phrase_id, english_phrase,
+        russian_translation, owner_id или кортежи в том же порядке).
+        """
+        phrases = [_as_row(phrase) for phrase in phrases]
+
+        with self._lock:
+            if not self.ready:
+                self._pending.extend(phrases)
+                return
+
+            phrases = [phrase for phrase in phrases if phrase[0] not in self._rows]
+            if not phrases:
+                return
+
+            old_size = self._size
+            self._append(phrases)
+
+            # Соседи новых фраз - по всему индексу
+            candidates = np.arange(self._size)
+            for start, stop in self._blocks(old_size, self._size, self._size):
+                top, scores = self._nearest(self._vectors[start:stop], candidates)
+                self._top[start:stop] = top
+                self._scores[start:stop] = scores
+
+            # Старые фразы получают новую в соседи, если она ближе худшего соседа
+            new_vectors = self._vectors[old_size:self._size]
+            new_rows = np.arange(old_size, self._size, dtype=np.int32)
+            for start, stop in self._blocks(0, old_size, len(phrases)):
+                cross = self._vectors[start:stop] @ new_vectors.T
+                cross[cross >= DUPLICATE_SIMILARITY] = -1
+
+                closer = np.nonzero(cross.max(axis=1) > self._scores[start:stop, -1])[0]
+                if not closer.size:
+                    continue
+
+                rows = closer + start
+                merged_top = np.concatenate(
+                    [self._top[rows], np.broadcast_to(new_rows, (rows.size, new_rows.size))],
+                    axis=1,
+                )
+                merged_scores = np.concatenate([self._scores[rows], cross[closer]], axis=1)
+                order = np.argsort(-merged_scores, axis=1, kind="stable")[:, :self.neighbours]
+                self._top[rows] = np.take_along_axis(merged_top, order, axis=1)
+                self._scores[rows] = np.take_along_axis(merged_scores, order, axis=1)
+
+    def remove_phrases(self, phrase_ids):
+        """Исключает удалённые фразы из вариантов (строки индекса остаются)."""
+        with self._lock:
+            for phrase_id in phrase_ids:
+                row = self._rows.get(phrase_id)
+                if row is not None:
+                    self._phrases[row] = (*self._phrases[row][:3], REMOVED)
+
+    def distractors(self, phrase_id, limit, user_id=None):
+        """
+        Случайные limit из ближайших соседей фразы, видимых пользователю
+        (словари как в database.py), или None, если фразы нет в индексе
+        или соседей не хватает.
+        """
+        with self._lock:
+            row = self._rows.get(phrase_id)
+            if not self.ready or row is None:
+                return None
+            neighbours = [
+                self._phrases[int(i)]
+                for i, score in zip(self._top[row], self._scores[row])
+                if i >= 0 and score >= 0
+            ]
+
+        neighbours = [
+            phrase for phrase in neighbours if phrase[3] is None or phrase[3] == user_id
+        ]
+
+        # Берём варианты из ближайших, но не всегда одни и те же
+        pool = neighbours[: limit * 2]
+        random.shuffle(pool)
+
+        seen_texts = {self._phrases[row][1].lower().strip()}
+        result = []
+        for phrase in pool:
+            text = phrase[1].lower().strip()
+            if text in seen_texts:
+                continue
+            seen_texts.add(text)
+            result.append(dict(zip(COLUMNS, phrase[:3])))
+            if len(result) == limit:
+                return result
+
+        return None
+
+    def _reset(self, capacity):
+        with self._lock:
+            self._size = 0
+            self._rows = {}
+            self._phrases = []
+            self._grow(capacity)
+
+    def _grow(self, capacity):
+        """Увеличивает массивы (с запасом, чтобы добавления не копировали их каждый раз)."""
+        if capacity <= len(self._vectors):
+            return
+
+        capacity = max(capacity, len(self._vectors) * 2)
+        vectors = np.zeros((capacity, self.dimensions), dtype=np.float32)
+        top = np.full((capacity, self.neighbours), -1, dtype=np.int32)
+        scores = np.full((capacity, self.neighbours), -1, dtype=np.float32)
+
+        vectors[:self._size] = self._vectors[:self._size]
+        top[:self._size] = self._top[:self._size]
+        scores[:self._size] = self._scores[:self._size]
+        self._vectors, self._top, self._scores = vectors, top, scores
+
+    def _append(self, phrases):
+        self._grow(self._size + len(phrases))
+        start = self._size
+        if phrases:
+            self._vectors[start:start + len(phrases)] = vectorize(
+                [phrase[1] for phrase in phrases], self.dimensions
+            )
+        for offset, phrase in enumerate(phrases):
+            self._rows[phrase[0]] = start + offset
+            self._phrases.append(phrase)
+        self._size = start + len(phrases)
+
+    def _blocks(self, start, stop, width):
+        """Блоки строк, матрица сходства которых (ширины width) укладывается в BLOCK_ELEMENTS."""
+        step = max(1, BLOCK_ELEMENTS // max(width, 1))
+        for block_start in range(start, stop, step):
+            yield block_start, min(block_start + step, stop)
+
+    def _nearest(self, vectors, candidates):
+        """Ближайшие соседи для блока векторов среди строк candidates."""
+        sims = vectors @ self._vectors[candidates].T
+        # Сама фраза и её дубликаты не могут быть неправильным вариантом
+        sims[sims >= DUPLICATE_SIMILARITY] = -1
+
+        top = np.full((len(vectors), self.neighbours), -1, dtype=np.int32)
+        scores = np.full((len(vectors), self.neighbours), -1, dtype=np.float32)
+
+        size = len(candidates)
+        k = min(self.neighbours, size)
+        if k == 0:
+            return top, scores
+
+        if k < size:
+            columns = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        else:
+            columns = np.broadcast_to(np.arange(size), (len(vectors), size))
+        column_scores = np.take_along_axis(sims, columns, axis=1)
+        order = np.argsort(-column_scores, axis=1, kind="stable")
+
+        top[:, :k] = candidates[np.take_along_axis(columns, order, axis=1)]
+        scores[:, :k] = np.take_along_axis(column_scores, order, axis=1)
+        top[scores < 0] = -1
+        return top, scores
+
+
+def start_similarity_index():
+    """
+    Строит индекс по каталогу и подключает его к get_wrong_phrases
+    (вызывается в фоне при запуске). Возвращает индекс или None.
+    """
+    if not config.SIMILARITY_INDEX:
+        return None
+    if np is None:
+        logger.warning("⚠️ numpy не установлен, варианты ответа выбираются случайно")
+        return None
+
+    import database
+
+    index = SimilarityIndex(
+        config.SIMILARITY_DIMENSIONS,
+        config.SIMILARITY_NEIGHBOURS,
+        config.SIMILARITY_MAX_CANDIDATES,
+    )
+    # Подписка до чтения каталога: фразы, добавленные во время построения, не теряются
+    database.subscribe("phrases_added", index.add_phrases)
+    database.subscribe("phrases_deleted", index.remove_phrases)
+    index.build(database.get_catalog_phrases())
+    database.set_distractor_index(index)
+    return index
+
+
+def test_similarity_index():
+    """Похожие фразы находятся, инкрементальное добавление совпадает с построением."""
+    phrases = [
+        (1, "take off", "взлетать"),
+        (2, "take on", "браться"),
+        (3, "take over", "перенимать"),
+        (4, "look after", "присматривать"),
+        (5, "look for", "искать"),
+        (6, "good morning", "доброе утро"),
+        (7, "Take off", "снимать"),
+        (8, "look forward to", "ждать с нетерпением"),
+    ]
+
+    full = SimilarityIndex(dimensions=256, neighbours=3)
+    full.build(phrases)
+
+    nearest = {full._phrases[i][0] for i in full._top[full._rows[1]][:2]}
+    assert nearest == {2, 3}, nearest
+    # Дубликат текста (phrase_id 7) никогда не попадает в варианты
+    for _ in range(20):
+        assert all(p["phrase_id"] != 7 for p in full.distractors(1, 3))
+    assert full.distractors(999, 3) is None
+
+    # Личная фраза видна в вариантах только владельцу
+    private = SimilarityIndex(dimensions=256, neighbours=3)
+    private.build(phrases[:3] + [(9, "take out", "вынимать", 42)])
+    seen = set()
+    for _ in range(20):
+        seen.update(p["phrase_id"] for p in private.distractors(1, 2, user_id=42))
+        assert all(p["phrase_id"] != 9 for p in private.distractors(1, 2, user_id=7))
+    assert 9 in seen
+    private.remove_phrases([9])
+    assert all(p["phrase_id"] != 9 for p in private.distractors(1, 2, user_id=42))
+
+    incremental = SimilarityIndex(dimensions=256, neighbours=3)
+    incremental.build(phrases[:3])
+    incremental.add_phrases(phrases[3:5])
+    incremental.add_phrases([dict(zip(COLUMNS, p)) for p in phrases[5:]])
+
+    for phrase_id in range(1, 9):
+        row_full = full._rows[phrase_id]
+        row_incremental = incremental._rows[phrase_id]
+        assert np.allclose(
+            full._scores[row_full], incremental._scores[row_incremental], atol=1e-6
+        ), phrase_id
+
+    print("✅ Индекс похожих фраз работает")
+
+
+if __name__ == "__main__":
+    test_similarity_index()
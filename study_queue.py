@@ -0,0 +1,209 @@
+import collections
+import logging
+import threading
+import time
+
+from metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+study_queue_cards = Counter(
+    "bot_study_queue_cards_total",
+    "Карточки, показанные из очереди (hit) и посчитанные при показе (miss)",
+    labels=("result",),
+)
+
+
+class _Entry:
+    """Очередь одного пользователя."""
+
+    __slots__ = ("deck", "cards", "current_id", "refilling", "updated_at")
+
+    def __init__(self, deck, current_id):
+        self.deck = deck
+        self.cards = collections.deque()
+        self.current_id = current_id
+        self.refilling = False
+        self.updated_at = time.monotonic()
+
+
+class StudyQueue:
+    """
+    Заранее подготовленные следующие карточки каждого пользователя.
+
+    build_cards(user_id, deck, count, exclude_phrase_ids) считает карточки
+    (фраза, варианты ответа, готовая клавиатура) в фоновом пуле executor,
+    а показ следующей карточки только снимает первую из очереди.
+    Когда карточек остаётся меньше low_water, очередь пополняется в фоне.
+
+    Очередь пользователя сбрасывается, когда меняется его набор фраз или
+    колода (события database.py), а также если она не обновлялась ttl секунд.
+    Очереди хранятся в памяти процесса, не больше чем для max_users
+    пользователей: давно не заходившие вытесняются.
+    """
+
+    def __init__(self, build_cards, executor, size=10, low_water=3, max_users=10000, ttl=600):
+        self._build_cards = build_cards
+        self._executor = executor
+        self.size = size
+        self.low_water = low_water
+        self.max_users = max_users
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+
+        Gauge("bot_study_queue_users", "Пользователи с очередью карточек").set_function(
+            lambda: len(self._entries)
+        )
+
+    def pop(self, user_id):
+        """Следующая карточка пользователя или None, если очередь пуста."""
+        if not self.size:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and time.monotonic() - entry.updated_at > self.ttl:
+                del self._entries[user_id]
+                entry = None
+
+            if entry is None or not entry.cards:
+                study_queue_cards.inc(result="miss")
+                return None
+
+            self._entries.move_to_end(user_id)
+            card = entry.cards.popleft()
+            entry.current_id = card["phrase"]["phrase_id"]
+            self._refill_if_low(user_id, entry)
+
+        study_queue_cards.inc(result="hit")
+        return card
+
+    def prime(self, user_id, deck, current_phrase_id):
+        """
+        Заводит очередь после карточки, посчитанной при показе:
+        deck - колода пользователя, current_phrase_id - показанная фраза.
+        """
+        if not self.size:
+            return
+
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry.deck != deck:
+                entry = _Entry(deck, current_phrase_id)
+                self._entries[user_id] = entry
+                while len(self._entries) > self.max_users:
+                    self._entries.popitem(last=False)
+            else:
+                entry.current_id = current_phrase_id
+
+            self._entries.move_to_end(user_id)
+            self._refill_if_low(user_id, entry)
+
+    def invalidate(self, user_id):
+        """Сбрасывает очередь пользователя (событие user_phrases_changed)."""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def discard_phrases(self, phrase_ids):
+        """Убирает карточки удалённых фраз из всех очередей (событие phrases_deleted)."""
+        phrase_ids = set(phrase_ids)
+        with self._lock:
+            for entry in self._entries.values():
+                if any(card["phrase"]["phrase_id"] in phrase_ids for card in entry.cards):
+                    entry.cards = collections.deque(
+                        card
+                        for card in entry.cards
+                        if card["phrase"]["phrase_id"] not in phrase_ids
+                    )
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _refill_if_low(self, user_id, entry):
+        """Ставит пополнение в фоновый пул (вызывается под блокировкой)."""
+        if entry.refilling or len(entry.cards) >= self.low_water:
+            return
+
+        entry.refilling = True
+        if self._executor.submit(self._refill, user_id, entry) is None:
+            # Пул занят - карточка будет посчитана при показе
+            entry.refilling = False
+
+    def _refill(self, user_id, entry):
+        with self._lock:
+            if self._entries.get(user_id) is not entry:
+                return
+            deck = entry.deck
+            exclude = [card["phrase"]["phrase_id"] for card in entry.cards]
+            if entry.current_id is not None:
+                exclude.append(entry.current_id)
+            count = self.size - len(entry.cards)
+
+        try:
+            cards = self._build_cards(user_id, deck, count, exclude)
+        except Exception as e:
+            logger.error(f"Не удалось пополнить очередь карточек {user_id}: {e}")
+            cards = []
+
+        with self._lock:
+            entry.refilling = False
+            # Пока карточки считались, очередь могли сбросить
+            if self._entries.get(user_id) is not entry:
+                return
+
+            queued = {card["phrase"]["phrase_id"] for card in entry.cards}
+            queued.add(entry.current_id)
+            entry.cards.extend(
+                card for card in cards if card["phrase"]["phrase_id"] not in queued
+            )
+            entry.updated_at = time.monotonic()
+
+
+def test_study_queue():
+    """Очередь пополняется в фоне, отдаёт карточки без повторов и сбрасывается."""
+    from bounded_executor import BoundedExecutor
+
+    catalog = list(range(1, 31))
+    calls = []
+
+    def build_cards(user_id, deck, count, exclude):
+        calls.append((user_id, deck, count, set(exclude)))
+        free = [phrase_id for phrase_id in catalog if phrase_id not in exclude]
+        return [{"phrase": {"phrase_id": phrase_id}} for phrase_id in free[:count]]
+
+    executor = BoundedExecutor(max_workers=1, max_queue=10, name="study-test")
+    queue = StudyQueue(build_cards, executor, size=5, low_water=2, max_users=2)
+
+    def wait_refills():
+        while executor.pending:
+            time.sleep(0.01)
+
+    assert queue.pop(1) is None
+    queue.prime(1, {"category": None, "level": None}, current_phrase_id=1)
+    wait_refills()
+
+    shown = [1]
+    for _ in range(12):
+        card = queue.pop(1)
+        assert card is not None
+        shown.append(card["phrase"]["phrase_id"])
+        wait_refills()
+    assert all(a != b for a, b in zip(shown, shown[1:])), shown
+    assert calls[0][3] == {1}, calls[0]
+
+    queue.invalidate(1)
+    assert queue.pop(1) is None
+
+    # Старые пользователи вытесняются
+    for user_id in (2, 3, 4):
+        queue.prime(user_id, {"category": None, "level": None}, current_phrase_id=1)
+    assert len(queue) == 2 and 2 not in queue._entries
+
+    executor.drain(5)
+    print("✅ Очередь карточек работает")
+
+
+if __name__ == "__main__":
+    test_study_queue()
@@ -0,0 +1,182 @@
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import threading
+import time
+import uuid
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Трассировка одного обновления: у обновления свой trace_id, а вызовы БД,
+# Telegram и словаря внутри обработчика записываются как спаны.
+# Медленные трассировки пишутся в лог одной JSON-строкой и, если задан
+# TRACE_EXPORT_PATH, дописываются в JSONL-файл.
+
+# Больше спанов в одной трассировке не записываем (защита от циклов)
+MAX_SPANS = 200
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_depth = contextvars.ContextVar("current_depth", default=0)
+_export_lock = threading.Lock()
+
+
+class Trace:
+    def __init__(self, attributes):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.attributes = attributes
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.spans = []
+        self.dropped_spans = 0
+        # Намеренные паузы обработчика (pause), не входят в длительность
+        self.paused = 0.0
+
+    def add_span(self, name, started, duration, depth, attributes, error):
+        if len(self.spans) >= MAX_SPANS:
+            self.dropped_spans += 1
+            return
+
+        span = {
+            "name": name,
+            "start_ms": round((started - self.started) * 1000, 3),
+            "duration_ms": round(duration * 1000, 3),
+            "depth": depth,
+        }
+        if attributes:
+            span["attributes"] = attributes
+        if error:
+            span["error"] = error
+        self.spans.append(span)
+
+    def to_dict(self, duration):
+        data = {
+            "trace_id": self.trace_id,
+            "started_at": self.started_at,
+            "duration_ms": round(duration * 1000, 3),
+            "paused_ms": round(self.paused * 1000, 3),
+            **self.attributes,
+            "spans": sorted(self.spans, key=lambda span: span["start_ms"]),
+        }
+        if self.dropped_spans:
+            data["dropped_spans"] = self.dropped_spans
+        return data
+
+
+def current_trace_id():
+    trace = _current_trace.get()
+    return trace.trace_id if trace else None
+
+
+@contextlib.contextmanager
+def start_trace(**attributes):
+    """Открывает трассировку для обработки одного обновления."""
+    trace = Trace(attributes)
+    trace_token = _current_trace.set(trace)
+    depth_token = _current_depth.set(0)
+
+    try:
+        yield trace
+    finally:
+        _current_depth.reset(depth_token)
+        _current_trace.reset(trace_token)
+        _finish_trace(trace, time.perf_counter() - trace.started)
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """Спан внутри текущей трассировки; вне трассировки ничего не делает."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+
+    depth = _current_depth.get()
+    depth_token = _current_depth.set(depth + 1)
+    started = time.perf_counter()
+    error = None
+
+    try:
+        yield
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _current_depth.reset(depth_token)
+        trace.add_span(
+            name, started, time.perf_counter() - started, depth, attributes, error
+        )
+
+
+def traced(name=None):
+    """Декоратор: вызов функции записывается как спан."""
+
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def pause(seconds):
+    """
+    Намеренная пауза в обработчике (например, перед следующей карточкой).
+    Записывается спаном, но не входит в длительность для порога TRACE_SLOW_MS.
+    """
+    trace = _current_trace.get()
+    started = time.perf_counter()
+    with span("pause", seconds=seconds):
+        time.sleep(seconds)
+    if trace is not None:
+        trace.paused += time.perf_counter() - started
+
+
+def _finish_trace(trace, duration):
+    duration -= trace.paused
+    if duration * 1000 < config.TRACE_SLOW_MS:
+        return
+
+    line = json.dumps(trace.to_dict(duration), ensure_ascii=False, default=str)
+    logger.warning(f"🐢 Медленное обновление: {line}")
+
+    if config.TRACE_EXPORT_PATH:
+        try:
+            with _export_lock:
+                with open(config.TRACE_EXPORT_PATH, "a", encoding="utf-8") as file:
+                    file.write(line + "\n")
+        except OSError as e:
+            logger.error(f"Не удалось записать трассировку: {e}")
+
+
+def test_tracing():
+    """Проверка: спаны вложены в трассировку и не пишутся вне неё."""
+    with span("outside"):
+        pass
+
+    with start_trace(update_id=1) as trace:
+        with span("handler"):
+            with span("db", function="get_user_stats"):
+                time.sleep(0.01)
+
+    names = [(item["name"], item["depth"]) for item in trace.spans]
+    assert names == [("db", 1), ("handler", 0)], names
+    assert trace.spans[0]["duration_ms"] >= 10
+    assert current_trace_id() is None
+
+    with start_trace(update_id=2) as trace:
+        pause(0.02)
+    assert trace.paused >= 0.02 and trace.spans[0]["name"] == "pause"
+    print("✅ Трассировка работает корректно")
+
+
+if __name__ == "__main__":
+    test_tracing()
@@ -1,6 +1,9 @@
 import requests
 import logging
+import threading
 from config import YA_DICTIONARY_API_KEY
+from metrics import Histogram
+from tracing import span
 
 # Настройка логирования
 logging.basicConfig(
@@ -9,10 +12,57 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+YANDEX_LOOKUP_URL = "https://dictionary.yandex.net/api/v1/dicservice.json/lookup"
+
+yandex_request_seconds = Histogram(
+    "bot_yandex_request_seconds", "Длительность запросов к Yandex Dictionary API"
+)
+
+
+class SingleFlight:
+    """
+    Объединяет одновременные одинаковые запросы: пока запрос по ключу
+    выполняется, остальные вызывающие ждут его и получают тот же результат.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, *args):
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = {"done": threading.Event(), "result": None, "error": None}
+                self._calls[key] = call
+
+        if not is_leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+
+        try:
+            call["result"] = func(*args)
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+
+        return call["result"]
+
+
+_lookups = SingleFlight()
+
 
 def get_word_definition(english_word):
     """
     Получает определение и примеры использования слова из Yandex Dictionary API.
+    Одновременные запросы одного и того же слова выполняются одним запросом.
     Возвращает None в случае ошибки.
     """
     if not YA_DICTIONARY_API_KEY:
@@ -23,17 +73,23 @@ def get_word_definition(english_word):
         logger.error(f"Неверный формат слова: {english_word}")
         return None
 
-    url = "https://dictionary.yandex.net/api/v1/dicservice.json/lookup"
+    word = english_word.lower().strip()
+    return _lookups.do(word, _fetch_word_definition, word)
+
+
+def _fetch_word_definition(english_word):
+    """Выполняет запрос к Yandex Dictionary API."""
     params = {
         "key": YA_DICTIONARY_API_KEY,
         "lang": "en-ru",
-        "text": english_word.lower().strip(),
+        "text": english_word,
         "ui": "ru",
     }
 
     try:
         logger.info(f"Запрос к Yandex API для слова: '{english_word}'")
-        response = requests.get(url, params=params, timeout=10)
+        with yandex_request_seconds.time(), span("yandex.lookup", word=english_word):
+            response = requests.get(YANDEX_LOOKUP_URL, params=params, timeout=10)
         response.raise_for_status()
 
         data = response.json()
@@ -142,75 +198,6 @@ def parse_dictionary_response(data, original_word):
         return None
 
 
-def get_phrase_examples(english_phrase):
-    """
-    Получает примеры использования для фразы.
-    Возвращает форматированную строку или сообщение об ошибке.
-    """
-    if not english_phrase or not isinstance(english_phrase, str):
-        return "❌ Неверный формат фразы"
-
-    english_phrase = english_phrase.strip()
-    if not english_phrase:
-        return "❌ Пустая фраза"
-
-    logger.info(f"Поиск примеров для фразы: '{english_phrase}'")
-
-    # Извлекаем первое значимое слово из фразы
-    words = english_phrase.split()
-    if not words:
-        return "❌ Не удалось извлечь слова из фразы"
-
-    # Ищем первое существительное/глагол/прилагательное
-    search_word = words[0]
-    for word in words:
-        word_clean = word.strip(",.!?;:\"'")
-        if len(word_clean) > 2:  # Пропускаем артикли, предлоги
-            search_word = word_clean
-            break
-
-    logger.info(f"Ищем слово для примера: '{search_word}'")
-
-    try:
-        result = get_word_definition(search_word)
-
-        if not result:
-            return f"❌ Информация для слова '{search_word}' не найдена"
-
-        # Форматируем результат
-        response_parts = []
-
-        if result.get("definitions"):
-            response_parts.append("📖 *Определения:*")
-            for i, definition in enumerate(result["definitions"][:3], 1):
-                response_parts.append(f"{i}. {definition}")
-
-        if result.get("examples"):
-            response_parts.append("\n💡 *Примеры использования:*")
-            for i, example in enumerate(result["examples"], 1):
-                response_parts.append(f"{i}. {example['english']}")
-                response_parts.append(f"   → {example['russian']}")
-
-        if result.get("transcriptions"):
-            response_parts.append(
-                f"\n🔊 *Транскрипция:* `{result['transcriptions'][0]}`"
-            )
-
-        if result.get("parts_of_speech"):
-            response_parts.append(
-                f"\n🏷️ *Часть речи:* {', '.join(result['parts_of_speech'])}"
-            )
-
-        if not response_parts:
-            return f"❌ Для слова '{search_word}' не найдено полезной информации"
-
-        return "\n".join(response_parts)
-
-    except Exception as e:
-        logger.error(f"Неожиданная ошибка при поиске примеров: {e}")
-        return f"❌ Ошибка при получении информации. Попробуйте позже."
-
-
 def test_yandex_api():
     """Тестирование работы Yandex Dictionary API."""
     test_words = ["hello", "computer", "beautiful", "run"]
@@ -234,5 +221,75 @@ def test_yandex_api():
             print("❌ Не найдено")
 
 
+def test_request_coalescing(callers=20):
+    """
+    Проверка объединения запросов: несколько одновременных вызовов
+    для одного слова должны дать ровно один запрос к (локальному) серверу.
+    """
+    import json
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    global YANDEX_LOOKUP_URL, YA_DICTIONARY_API_KEY
+
+    hits = []
+    payload = json.dumps(
+        {
+            "def": [
+                {
+                    "text": "hello",
+                    "pos": "interjection",
+                    "ts": "həˈləʊ",
+                    "tr": [{"text": "привет"}],
+                }
+            ]
+        }
+    ).encode("utf-8")
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            time.sleep(0.3)  # имитируем медленный ответ словаря
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    saved_url, saved_key = YANDEX_LOOKUP_URL, YA_DICTIONARY_API_KEY
+    YANDEX_LOOKUP_URL = f"http://127.0.0.1:{server.server_port}/lookup"
+    YA_DICTIONARY_API_KEY = YA_DICTIONARY_API_KEY or "stub-key"
+
+    barrier = threading.Barrier(callers)
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(get_word_definition("Hello"))
+
+    try:
+        threads = [threading.Thread(target=worker) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        YANDEX_LOOKUP_URL, YA_DICTIONARY_API_KEY = saved_url, saved_key
+        server.shutdown()
+        server.server_close()
+
+    assert len(results) == callers, results
+    assert all(r and r["definitions"] == ["привет"] for r in results), results
+    assert len(hits) == 1, f"Ожидался 1 запрос к API, получено {len(hits)}"
+    print(f"✅ {callers} одновременных вызовов -> {len(hits)} запрос к API")
+
+
 if __name__ == "__main__":
+    test_request_coalescing()
     test_yandex_api()
\ No newline at end of file